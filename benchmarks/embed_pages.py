@@ -0,0 +1,49 @@
+"""Benchmark of core.pages.build_pages, the page builder behind ModularEmbedList
+
+Run from the repository root:
+    python -m benchmarks.embed_pages
+"""
+
+import random
+import string
+import time
+
+from core.pages import DESCRIPTION_LIMIT, build_pages
+
+
+def generate_entries(count: int, oversized_every: int = 1000) -> list[str]:
+    "Plugin-listing sized entries with an occasional entry larger than a page"
+
+    rng = random.Random(count)
+    entries: list[str] = []
+    for i in range(count):
+        if i % oversized_every == 0:
+            lines = ["".join(rng.choices(string.ascii_letters, k=80))] * 100
+            entries.append("\n".join(lines))
+        else:
+            entries.append(
+                "🟩 " + "".join(rng.choices(string.ascii_letters, k=rng.randint(8, 40)))
+            )
+    return entries
+
+
+def run(count: int, repeat: int = 5) -> None:
+    entries = generate_entries(count)
+    characters = sum(len(i) for i in entries)
+
+    timings: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pages = build_pages(entries, DESCRIPTION_LIMIT)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(
+        f"{count:>7} entries | {characters:>9} chars | {len(pages):>5} pages | "
+        f"best {best * 1000:8.2f} ms | {characters / best / 1e6:6.1f} Mchar/s"
+    )
+
+
+if __name__ == "__main__":
+    for count in (10_000, 100_000):
+        run(count)
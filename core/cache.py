@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+from models.config import Config
+from models.guild import Guild
+from sqlmodel import select, update
+
+if TYPE_CHECKING:
+    from main import ModularBot
+
+DEFAULT_PREFIX = "!"
+
+
+class PrefixCache:
+    """In-memory guild_id -> prefix mapping, keeps the database off the message path
+
+    Attributes:
+        `default`: Prefix returned for guilds that are not cached
+        `hits`: Number of lookups answered from the cache
+        `misses`: Number of lookups that fell back to the default prefix
+
+    Example:
+        >>> cache = PrefixCache()
+        >>> cache.populate(guilds)
+        >>> cache.get(guild_id)
+        >>> cache.set(guild_id, "?")
+    """
+
+    def __init__(self, default: str = DEFAULT_PREFIX) -> None:
+        self.logger = logging.getLogger("prefix-cache")
+        self.default = default
+        self.hits = 0
+        self.misses = 0
+
+        self._prefixes: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._prefixes)
+
+    def __repr__(self) -> str:
+        return f"PrefixCache(size={len(self)}, hits={self.hits}, misses={self.misses})"
+
+    def populate(self, guilds: Iterable[Guild]) -> None:
+        "Replaces the cache content with prefixes from database rows"
+
+        self._prefixes = {guild.id: guild.prefix for guild in guilds}
+        self.logger.info(f"Cached prefixes for {len(self._prefixes)} guilds")
+
+    def get(self, guild_id: int) -> str:
+        "Returns the prefix for the guild, never touches the database"
+
+        prefix = self._prefixes.get(guild_id)
+        if prefix is None:
+            self.misses += 1
+            return self.default
+
+        self.hits += 1
+        return prefix
+
+    def set(self, guild_id: int, prefix: str) -> None:
+        self._prefixes[guild_id] = prefix
+
+    def remove(self, guild_id: int) -> None:
+        self._prefixes.pop(guild_id, None)
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
+
+
+class ConfigCache:
+    """Keeps the bot Config row in memory, refreshed in the background after `ttl` seconds
+
+    Attributes:
+        `bot`: The bot instance
+        `ttl`: Seconds after which the cached row is considered stale
+        `loaded_at`: `time.monotonic()` of the last successful load
+
+    Example:
+        >>> await bot.config_cache.refresh()
+        >>> bot.config_cache.get().main_color
+        >>> await bot.config_cache.update(main_color=0x00FF00)
+    """
+
+    def __init__(self, bot: "ModularBot", ttl: float = 300) -> None:
+        self.logger = logging.getLogger("config-cache")
+        self.bot = bot
+        self.ttl = ttl
+        self.loaded_at: float = 0.0
+
+        self._config: Config = Config()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def stale(self) -> bool:
+        return time.monotonic() - self.loaded_at > self.ttl
+
+    def get(self) -> Config:
+        "Returns the cached config, schedules a refresh if it is stale, never waits for the database"
+
+        if self.stale and (self._refresh_task is None or self._refresh_task.done()):
+            try:
+                self._refresh_task = asyncio.get_running_loop().create_task(
+                    self._background_refresh()
+                )
+            except RuntimeError:
+                pass  # No running loop, the stale value is served until refresh()
+
+        return self._config
+
+    async def refresh(self) -> Config:
+        "Reloads the config from the database, creates the default one if missing"
+
+        async with self.bot.session() as session:
+            config = (await session.exec(select(Config))).first()
+
+            if not config:
+                logging.warning("No config found, creating one")
+                config = Config()
+                session.add(config)
+                await session.commit()
+                logging.info("Config created")
+
+        self._config = config
+        self.loaded_at = time.monotonic()
+        self.logger.debug(f"Config refreshed: {config}")
+        return config
+
+    async def _background_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            self.logger.error(f"Could not refresh config: {e}")
+
+    async def update(self, **values: Any) -> Config:
+        "Writes the values to the database and the cache at once"
+
+        async with self.bot.session() as session:
+            await session.execute(update(Config).values(**values))
+            await session.commit()
+
+        for key, value in values.items():
+            setattr(self._config, key, value)
+        self.loaded_at = time.monotonic()
+        return self._config
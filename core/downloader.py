@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Iterable, Optional, Union
+
+import aiohttp
+
+
+class DownloadError(Exception):
+    pass
+
+
+class HashMismatch(DownloadError):
+    pass
+
+
+def hash_file(path: str, chunk_size: int = 1 << 16) -> str:
+    "SHA-256 hex digest of the file"
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Downloader:
+    """Concurrent file downloader sharing one HTTP connection pool
+
+    Files are streamed into `<path>.part`, hashed on the way and moved in place only
+    when complete and matching the expected hash. Failed attempts are retried with
+    exponential backoff, except for 4xx responses other than 429.
+
+    Attributes:
+        `concurrency`: Maximum number of downloads running at once
+        `retries`: Attempts after the first one failed
+        `backoff`: Delay before the first retry, doubled on each further retry
+        `timeout`: Total timeout of one attempt in seconds
+        `session`: aiohttp session to use, one is created and closed by `async with` if not provided
+
+    Example:
+        >>> async with Downloader(concurrency=4) as downloader:
+        >>>     digest = await downloader.download(url, "plugins/example/main.py")
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 60,
+        session: Optional[aiohttp.ClientSession] = None,
+        chunk_size: int = 1 << 16,
+    ) -> None:
+        self.logger = logging.getLogger("downloader")
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.session = session
+
+        self._owns_session = session is None
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def __aenter__(self) -> "Downloader":
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def download(
+        self, url: str, path: str, expected_hash: Optional[str] = None
+    ) -> str:
+        "Downloads the url to the path, returns the SHA-256 of the content, raises DownloadError"
+
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    return await self._fetch(url, path, expected_hash)
+                except (aiohttp.ClientError, asyncio.TimeoutError, HashMismatch) as e:
+                    if attempt == self.retries or not self._retryable(e):
+                        raise DownloadError(f"{url}: {e}") from e
+
+                    delay = self.backoff * 2**attempt
+                    self.logger.warning(
+                        f"Download of {url} failed ({e}), retrying in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+
+        raise DownloadError(url)  # Unreachable, keeps type checkers happy
+
+    @staticmethod
+    def _retryable(error: BaseException) -> bool:
+        "Client errors won't go away by asking again, except for rate limits"
+
+        if isinstance(error, aiohttp.ClientResponseError):
+            return not 400 <= error.status < 500 or error.status == 429
+        return True
+
+    async def download_all(
+        self, files: Iterable[tuple[str, str, Optional[str]]]
+    ) -> list[Union[str, BaseException]]:
+        "Downloads (url, path, expected_hash) items concurrently, returns hashes or exceptions in order"
+
+        return await asyncio.gather(
+            *(self.download(url, path, expected) for url, path, expected in files),
+            return_exceptions=True,
+        )
+
+    async def _fetch(self, url: str, path: str, expected_hash: Optional[str]) -> str:
+        if self.session is None:
+            raise RuntimeError("Downloader must be used with `async with`")
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        partial = path + ".part"
+        digest = hashlib.sha256()
+
+        try:
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                with open(partial, "wb") as f:
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        digest.update(chunk)
+                        f.write(chunk)
+
+            content_hash = digest.hexdigest()
+            if expected_hash is not None and content_hash != expected_hash.lower():
+                raise HashMismatch(f"expected {expected_hash}, got {content_hash}")
+
+            os.replace(partial, path)
+            return content_hash
+
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
@@ -5,15 +5,18 @@ import discord
 from discord.colour import Colour
 from discord.embeds import _EmptyEmbed
 from discord.ext.commands import Context
-from models.config import Config
-from sqlmodel import select
 
+from core.pages import DESCRIPTION_LIMIT, EMBED_LIMIT, build_pages
 from core.paginator import Paginator
 
 if TYPE_CHECKING:
     from main import ModularBot
 
 
+# Longest footer set by the paginator, "(page/pages)"
+FOOTER_RESERVE = 32
+
+
 class NoDataProvided(Exception):
     pass
 
@@ -31,9 +34,7 @@ class ModularEmbed(discord.Embed):
         description: Union[object, _EmptyEmbed] = _EmptyEmbed(),
         timestamp: Union[datetime.datetime, _EmptyEmbed] = _EmptyEmbed()
     ) -> None:
-        config = bot.database.exec(select(Config)).first()
-        if config:
-            color = config.main_color
+        color = bot.config.main_color
 
         super().__init__(
             color=color,
@@ -71,7 +72,11 @@ class ModularEmbedList:
         self.title = title
 
         self.data: list[str] = []
-        self.limit = 4000
+
+        # Room for the title and the page footer, Discord limits the whole embed
+        self.limit = min(
+            DESCRIPTION_LIMIT, EMBED_LIMIT - len(str(title or "")) - FOOTER_RESERVE
+        )
 
     def add_data(self, data: str) -> None:
         self.data.append(data)
@@ -80,34 +85,13 @@ class ModularEmbedList:
         if not self.data:
             raise NoDataProvided("No data to build")
 
-        embeds: list[discord.Embed] = []
-        page: str = ""
-
-        for data in self.data:
-            if len(data) > self.limit:
-                i: list[str] = []
-                current = ""
-
-                for char in data:
-                    if len(current) < self.limit - 1:
-                        current += char
-                    else:
-                        i.append(current)
-                        current = ""
-
-            else:
-                i = [data]
-
-            for item in data:
-                if len(page) + len(item) > self.limit:
-                    embeds.append(
-                        ModularEmbed(self.bot, title=self.title, description=page)
-                    )
-                    page = ""
-                else:
-                    page += item
-
-            # Add the last page
-            embeds.append(ModularEmbed(self.bot, title=self.title, description=page))
-
-        return Paginator(ctx=self.ctx, embeds=embeds)
+        # Page text is cheap, embeds are only rendered for the pages that get viewed
+        pages = build_pages(self.data, self.limit)
+
+        return Paginator(
+            ctx=self.ctx,
+            source=lambda index: ModularEmbed(
+                self.bot, title=self.title, description=pages[index]
+            ),
+            page_count=len(pages),
+        )
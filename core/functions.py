@@ -23,13 +23,13 @@ async def confirm(
         embed.set_author(name=author, icon_url=bot.user.avatar_url.__str__())
 
         msg = await ctx.send(embed=embed)
-        await msg.add_reaction("✅")
-        await msg.add_reaction("❌")
 
-        def check(reaction: discord.Reaction, user: discord.User) -> bool:
-            return user == ctx.message.author and str(reaction.emoji) in ["✅", "❌"]
+        with bot.reactions.open(msg, ctx.message.author, ["✅", "❌"]) as session:
+            await msg.add_reaction("✅")
+            await msg.add_reaction("❌")
+
+            reaction, _ = await session.wait(timeout=timeout)
 
-        reaction, _ = await bot.wait_for("reaction_add", timeout=timeout, check=check)
         if reaction.emoji == "❌":
             await msg.delete()
             return False
@@ -0,0 +1,93 @@
+import logging
+import time
+from typing import TYPE_CHECKING, Iterator, NamedTuple
+
+from models.guild import Guild
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlmodel import delete, insert, select
+
+if TYPE_CHECKING:
+    from main import ModularBot
+
+logger = logging.getLogger("guilds")
+
+# Rows per statement, keeps bound parameters under the Postgres limit
+CHUNK_SIZE = 5000
+
+
+class ReconcileReport(NamedTuple):
+    guilds: int
+    added: int
+    pruned: int
+    seconds: float
+
+
+def _chunks(ids: list[int], size: int = CHUNK_SIZE) -> Iterator[list[int]]:
+    for i in range(0, len(ids), size):
+        yield ids[i : i + size]
+
+
+async def load_prefixes(bot: "ModularBot") -> None:
+    """Fills the prefix cache from the Guild table
+
+    Needs no gateway connection, so prefixes are served before the guilds are
+    reconciled.
+    """
+
+    async with bot.session() as session:
+        bot.prefix_cache.populate((await session.exec(select(Guild))).all())
+
+
+async def reconcile_guilds(bot: "ModularBot", prune: bool = False) -> ReconcileReport:
+    """Brings the Guild table in line with the guilds the bot is in
+
+    One query reads all known guilds, missing ones are added with bulk inserts
+    (ON CONFLICT DO NOTHING on Postgres) and, with `prune`, guilds the bot has left
+    are deleted. Everything is committed once and the prefix cache is repopulated.
+    """
+
+    start = time.perf_counter()
+    current = {guild.id for guild in bot.guilds}
+
+    async with bot.session() as session:
+        rows = (await session.exec(select(Guild))).all()
+        known = {row.id for row in rows}
+
+        missing = sorted(current - known)
+        stale = sorted(known - current) if prune else []
+
+        if bot.engine.dialect.name == "postgresql":
+            statement = postgresql_insert(Guild).on_conflict_do_nothing(
+                index_elements=["id"]
+            )
+        else:
+            statement = insert(Guild)
+
+        default = bot.prefix_cache.default
+        for chunk in _chunks(missing):
+            await session.execute(
+                statement, [{"id": guild_id, "prefix": default} for guild_id in chunk]
+            )
+
+        for chunk in _chunks(stale):
+            await session.execute(delete(Guild).where(Guild.id.in_(chunk)))  # type: ignore
+
+        await session.commit()
+
+    pruned = set(stale)
+    bot.prefix_cache.populate(
+        [row for row in rows if row.id not in pruned]
+        + [Guild(id=guild_id, prefix=default) for guild_id in missing]
+    )
+
+    report = ReconcileReport(
+        guilds=len(current),
+        added=len(missing),
+        pruned=len(stale),
+        seconds=time.perf_counter() - start,
+    )
+    logger.info(
+        f"Reconciled {report.guilds} guilds in {report.seconds * 1000:.1f} ms: "
+        f"{report.added} added, {report.pruned} pruned"
+    )
+    return report
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Optional
+
+from discord.ext import commands
+from discord.ext.commands.context import Context
+
+from core.manifest import CommandInfo
+from core.plugin import Plugin
+
+if TYPE_CHECKING:
+    from main import ModularBot
+
+
+class LazyLoader:
+    """Registers command stubs for lazy plugins and loads the real plugin on first use
+
+    Stubs are built from the commands found in the plugin files without importing them.
+    The first invocation of a stub loads the plugin and invokes the real command with
+    the same message. Only plugins that consist of commands should be lazy, listeners
+    and tasks of a plugin don't run until one of its commands is used.
+
+    Attributes:
+        `bot`: The bot instance
+        `idle_timeout`: Seconds without a command after which a loaded plugin is unloaded again, None to keep it loaded
+        `manifests`: Commands of every lazy plugin
+        `last_used`: Monotonic time of the last command of every loaded lazy plugin
+
+    Example:
+        >>> loader = LazyLoader(bot, idle_timeout=3600)
+        >>> loader.register(plugin, plugin.manifest())
+    """
+
+    def __init__(self, bot: "ModularBot", idle_timeout: Optional[float] = None) -> None:
+        self.logger = logging.getLogger("lazy-loader")
+        self.bot = bot
+        self.idle_timeout = idle_timeout
+
+        self.manifests: dict[int, list[CommandInfo]] = {}
+        self.last_used: dict[int, float] = {}
+
+        self._plugins: dict[int, Plugin] = {}
+        self._stubs: dict[int, list[str]] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def pending(self, plugin_id: int) -> bool:
+        "True if the plugin is lazy and only its stubs are registered"
+
+        return plugin_id in self._stubs
+
+    def register(self, plugin: Plugin, manifest: list[CommandInfo]) -> None:
+        self._plugins[plugin.id] = plugin
+        self.manifests[plugin.id] = manifest
+        self._add_stubs(plugin)
+
+        if self.idle_timeout is not None and self._reaper is None:
+            self._reaper = asyncio.get_running_loop().create_task(self._reap())
+
+    def refresh(self, plugin: Plugin) -> None:
+        "Rebuilds the stubs of a plugin that is not loaded yet, after its files changed"
+
+        self._remove_stubs(plugin.id)
+        self.manifests[plugin.id] = plugin.manifest()
+        self._add_stubs(plugin)
+
+    def _add_stubs(self, plugin: Plugin) -> None:
+        names: list[str] = []
+        for info in self.manifests[plugin.id]:
+            if self.bot.get_command(info.name) is not None:
+                self.logger.warning(
+                    f"Command {info.name} of {plugin.name} is already registered, no stub"
+                )
+                continue
+
+            self.bot.add_command(
+                commands.Command(
+                    self._stub(plugin.id),
+                    name=info.name,
+                    aliases=[
+                        i for i in info.aliases if self.bot.get_command(i) is None
+                    ],
+                    help=info.help,
+                )
+            )
+            names.append(info.name)
+
+        self._stubs[plugin.id] = names
+        self.logger.debug(f"Stubs of {plugin.name}: {names}")
+
+    def _remove_stubs(self, plugin_id: int) -> None:
+        for name in self._stubs.pop(plugin_id, []):
+            self.bot.remove_command(name)
+
+    def _stub(self, plugin_id: int):
+        async def stub(ctx: Context, *, arguments: str = "") -> None:
+            if not await self.ensure_loaded(plugin_id):
+                await ctx.send(f"❌ Could not load {self._plugins[plugin_id].name}")
+                return
+
+            # The stub is gone now, parse the message again to reach the real command
+            real = await self.bot.get_context(ctx.message)
+            if real.command is None:
+                self.logger.error(
+                    f"{self._plugins[plugin_id].name} does not provide {ctx.invoked_with}"
+                )
+                return
+
+            await self.bot.invoke(real)
+
+        return stub
+
+    async def ensure_loaded(self, plugin_id: int) -> bool:
+        "Loads the plugin if it is not loaded yet, returns False if it failed to load"
+
+        async with self._locks.setdefault(plugin_id, asyncio.Lock()):
+            if plugin_id in self.last_used:
+                self.last_used[plugin_id] = time.monotonic()
+                return True
+
+            plugin = self._plugins[plugin_id]
+            self._remove_stubs(plugin_id)
+
+            import_time = await asyncio.get_running_loop().run_in_executor(
+                None, plugin.preload
+            )
+            start = time.perf_counter()
+            if not plugin.load():
+                plugin.unload()
+                self._add_stubs(plugin)
+                return False
+
+            seconds = import_time + time.perf_counter() - start
+            self.bot.plugin_handler.load_report[plugin.name] = seconds
+            self.last_used[plugin_id] = time.monotonic()
+            self.logger.info(
+                f"Lazy plugin {plugin.name} loaded in {seconds * 1000:.1f} ms"
+            )
+            return True
+
+    def unload(self, plugin_id: int) -> None:
+        "Unloads a loaded lazy plugin and puts its stubs back"
+
+        plugin = self._plugins[plugin_id]
+        plugin.unload()
+        self.last_used.pop(plugin_id, None)
+        self.bot.plugin_handler.load_report.pop(plugin.name, None)
+        self._add_stubs(plugin)
+
+    def forget(self, plugin_id: int) -> None:
+        "Stops handling the plugin lazily and removes its stubs, does not unload it"
+
+        self._remove_stubs(plugin_id)
+        self.last_used.pop(plugin_id, None)
+        self.manifests.pop(plugin_id, None)
+        self._plugins.pop(plugin_id, None)
+
+    async def on_command(self, ctx: Context) -> None:
+        module = getattr(ctx.command, "module", None) or ""
+        for plugin_id in self.last_used:
+            if module.startswith(f"plugins.{self._plugins[plugin_id].folder_name}."):
+                self.last_used[plugin_id] = time.monotonic()
+                return
+
+    async def _reap(self) -> None:
+        assert self.idle_timeout is not None
+
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4, 1))
+
+            now = time.monotonic()
+            for plugin_id, used in list(self.last_used.items()):
+                if now - used < self.idle_timeout or self._locks[plugin_id].locked():
+                    continue
+
+                self.logger.info(
+                    f"Unloading idle lazy plugin {self._plugins[plugin_id].name}"
+                )
+                self.unload(plugin_id)
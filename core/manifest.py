@@ -0,0 +1,77 @@
+import ast
+from typing import NamedTuple, Optional
+
+# Decorators that register a command, as in `@commands.command(...)` or `@bot.group(...)`
+COMMAND_DECORATORS = {"command", "group"}
+
+
+class CommandInfo(NamedTuple):
+    name: str
+    aliases: list[str]
+    help: Optional[str]
+    file: str
+
+
+def _constant(node: Optional[ast.AST]) -> object:
+    return node.value if isinstance(node, ast.Constant) else None
+
+
+def _decorator_target(decorator: ast.Call) -> tuple[Optional[str], Optional[str]]:
+    "Returns (owner, name) of a decorator call, `@commands.command()` gives ('commands', 'command')"
+
+    target = decorator.func
+    if isinstance(target, ast.Name):
+        return None, target.id
+    if isinstance(target, ast.Attribute):
+        owner = target.value.id if isinstance(target.value, ast.Name) else None
+        return owner, target.attr
+    return None, None
+
+
+def scan_commands(source: str, file: str = "") -> list[CommandInfo]:
+    """Finds top level commands declared in the source without executing it
+
+    Subcommands registered on a group (`@group.command()`) are skipped, they are
+    reachable through their parent.
+    """
+
+    groups: set[str] = set()
+    commands: list[CommandInfo] = []
+
+    for node in ast.walk(ast.parse(source)):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+
+        for decorator in node.decorator_list:
+            if not isinstance(decorator, ast.Call):
+                continue
+
+            owner, kind = _decorator_target(decorator)
+            if kind not in COMMAND_DECORATORS or owner in groups:
+                continue
+
+            keywords = {i.arg: i.value for i in decorator.keywords if i.arg}
+            name = _constant(keywords.get("name"))
+            if name is None and decorator.args:
+                name = _constant(decorator.args[0])
+
+            aliases = keywords.get("aliases")
+            help = _constant(keywords.get("help")) or ast.get_docstring(node)
+
+            if kind == "group":
+                groups.add(node.name)
+
+            commands.append(
+                CommandInfo(
+                    name=name if isinstance(name, str) else node.name,
+                    aliases=[
+                        i.value
+                        for i in getattr(aliases, "elts", [])
+                        if isinstance(i, ast.Constant) and isinstance(i.value, str)
+                    ],
+                    help=help if isinstance(help, str) else None,
+                    file=file,
+                )
+            )
+
+    return commands
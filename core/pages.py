@@ -0,0 +1,81 @@
+from typing import Iterable
+
+# Discord embed limits, see https://discord.com/developers/docs/resources/channel#embed-object-embed-limits
+DESCRIPTION_LIMIT = 4096
+EMBED_LIMIT = 6000
+
+
+def split_entry(entry: str, limit: int) -> list[str]:
+    """Splits an entry into chunks of at most `limit` characters
+
+    Chunks are cut on line boundaries where possible, lines that are longer than
+    the limit on their own are sliced. No characters are dropped.
+    """
+
+    if len(entry) <= limit:
+        return [entry]
+
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+
+    for line in entry.split("\n"):
+        if len(line) > limit:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+
+            # Full slices become chunks, the rest is packed like any other line
+            end = (len(line) - 1) // limit * limit
+            chunks.extend(line[i : i + limit] for i in range(0, end, limit))
+            line = line[end:]
+
+        added = len(line) + 1 if current else len(line)
+        if current and size + added > limit:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+            added = len(line)
+
+        current.append(line)
+        size += added
+
+    if current:
+        chunks.append("\n".join(current))
+
+    return chunks
+
+
+def build_pages(
+    entries: Iterable[str], limit: int = DESCRIPTION_LIMIT, separator: str = "\n"
+) -> list[str]:
+    """Packs entries into as few pages as possible, each at most `limit` characters long
+
+    Runs in linear time, every character is copied once by the final join.
+
+    Example:
+        >>> build_pages(["a", "b", "c"], limit=3)
+        ['a\\nb', 'c']
+    """
+
+    if limit <= 0:
+        raise ValueError("Page limit must be positive")
+
+    pages: list[str] = []
+    current: list[str] = []
+    size = 0
+
+    for entry in entries:
+        for chunk in split_entry(entry, limit):
+            added = len(chunk) + len(separator) if current else len(chunk)
+            if current and size + added > limit:
+                pages.append(separator.join(current))
+                current, size = [], 0
+                added = len(chunk)
+
+            current.append(chunk)
+            size += added
+
+    if current:
+        pages.append(separator.join(current))
+
+    return pages
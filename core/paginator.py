@@ -3,60 +3,91 @@ MODIFIED FILE - original author toxicrecker
 MODIFIED BY - Stax124
 
 LICENSE:
-	MIT License
- 
-	Copyright (c) 2018 toxicrecker
- 
-	Permission is hereby granted, free of charge, to any person obtaining a copy
-	of this software and associated documentation files (the "Software"), to deal
-	in the Software without restriction, including without limitation the rights
-	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-	copies of the Software, and to permit persons to whom the Software is
-	furnished to do so, subject to the following conditions:
-	The above copyright notice and this permission notice shall be included in all
-	copies or substantial portions of the Software.
- 
-	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-	SOFTWARE.
+    MIT License
+
+    Copyright (c) 2018 toxicrecker
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
 """
 
 import asyncio
+import inspect
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Optional, Union
 
 import discord
 from discord.ext.commands import Context
 
+# Buttons need discord.py 2.0, older versions fall back to reactions
+COMPONENTS_AVAILABLE = hasattr(discord, "ui")
+
+PageSource = Union[
+    Callable[[int], Union[discord.Embed, Awaitable[discord.Embed]]],
+    AsyncIterator[discord.Embed],
+]
+
 
 class Paginator:
     """Utility for fast pagination of discord embeds
 
+    Pages come either from a list of embeds or, in lazy mode, from a `source`:
+    a callable (sync or async) mapping a page index to an embed, or an async iterator
+    yielding embeds in order. Lazy pages are only rendered when they are viewed.
+
     Attributes:
             `ctx`: The context of the command
             `embeds`: A list of `discord.Embed` objects
+            `source`: Lazy page source, used instead of `embeds`
+            `page_count`: Number of pages of the source, unknown if not provided for an async iterator
+            `cache_size`: How many rendered pages of a callable source are kept
             `auto_footer`: Whether to add a footer with page number to the embeds
             `remove_reactions`: Whether to remove reaction when clicking on the control emojis
             `timeout`: The amount of time to wait for a reaction before closing the paginator
             `control_emojis`: The emojis to use for the control emojis
+            `use_buttons`: Whether to use message buttons instead of reactions where the library supports them
 
     Example:
             >>> embeds = [discord.Embed(title="Page 1"), discord.Embed(title="Page 2")]
             >>> paginator = Paginator(ctx, embeds, auto_footer=False)
             >>> await paginator.run()
+
+            >>> paginator = Paginator(ctx, source=lambda i: discord.Embed(title=f"Page {i+1}"), page_count=1000)
+            >>> await paginator.run()
     """
 
     def __init__(
         self,
         ctx: Context,
-        embeds: list[discord.Embed],
+        embeds: Optional[list[discord.Embed]] = None,
         auto_footer: bool = True,
         remove_reactions: bool = True,
         timeout: int = 0,
         control_emojis: tuple = ("⏮️", "⏪", "🔐", "⏩", "⏭️"),
+        *,
+        use_buttons: bool = True,
+        source: Optional[PageSource] = None,
+        page_count: Optional[int] = None,
+        cache_size: int = 8,
     ) -> None:
+        if (embeds is None) == (source is None):
+            raise ValueError("Provide either embeds or a page source")
+
         self.ctx = ctx
         self.bot = ctx.bot
         self.current_page = 0
@@ -65,120 +96,205 @@ class Paginator:
         self.control_emojis = control_emojis
         self.timeout = int(timeout)
         self.embeds = embeds
+        self.source = source
+        self.cache_size = cache_size
+        self.use_buttons = use_buttons
+
+        self.logger = logging.getLogger("paginator")
+        # REST requests made by the last run, sends, edits and reaction changes
+        self.rest_calls = 0
+
+        self.page_count: Optional[int] = (
+            len(embeds) if embeds is not None else page_count
+        )
+        if callable(source) and self.page_count is None:
+            raise ValueError("page_count is required for a callable page source")
+
+        # Rendered pages of a callable source, least recently used first
+        self._cache: OrderedDict[int, discord.Embed] = OrderedDict()
+        # Pages of an async iterator source, it can't be rewound so they are all kept
+        self._iterated: list[discord.Embed] = []
+
+    async def get_page(self, index: int) -> discord.Embed:
+        "Returns the embed of the page, renders it if needed, raises IndexError if it does not exist"
+
+        if index < 0 or (self.page_count is not None and index >= self.page_count):
+            raise IndexError(index)
+
+        if self.embeds is not None:
+            return self.embeds[index]
+
+        if callable(self.source):
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+
+            embed = self.source(index)
+            if inspect.isawaitable(embed):
+                embed = await embed
+
+            self._cache[index] = embed
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return embed
+
+        while len(self._iterated) <= index:
+            try:
+                self._iterated.append(await self.source.__anext__())  # type: ignore
+            except StopAsyncIteration:
+                self.page_count = len(self._iterated)
+                raise IndexError(index)
+        return self._iterated[index]
+
+    async def last_page(self) -> int:
+        "Index of the last page, exhausts an async iterator source of unknown length"
+
+        if self.page_count is None:
+            try:
+                while True:
+                    await self.get_page(len(self._iterated))
+            except IndexError:
+                pass
+        return self.page_count - 1  # type: ignore
+
+    async def show(self, msg: discord.Message, index: int) -> None:
+        "Shows the page in the message, stays on the current page if it does not exist"
+
+        embed = await self._render(index)
+        if embed is not None:
+            self.rest_calls += 1
+            await msg.edit(embed=embed)
+
+    async def _render(self, index: int) -> Optional[discord.Embed]:
+        "Makes the page current, returns None if it does not exist or is already shown"
+
+        if index == self.current_page:
+            return None
+
+        try:
+            embed = await self.get_page(index)
+        except IndexError:
+            return None
+
+        self.current_page = index
+        self._set_footer(embed)
+        return embed
+
+    async def _target(self, control: int) -> int:
+        "Page index the control emoji on the position leads to"
+
+        if control == 0:
+            return 0
+        elif control == 1:
+            return max(self.current_page - 1, 0)
+        elif control == 3:
+            return self.current_page + 1
+        else:
+            return await self.last_page()
+
+    def _set_footer(self, embed: discord.Embed) -> None:
+        if self.auto_footer:
+            total = self.page_count if self.page_count is not None else "?"
+            embed.set_footer(text=f"({self.current_page+1}/{total})")
 
     async def run(self) -> None:
         """Run the paginator, exit after timeout"""
 
-        if self.auto_footer:
-            self.embeds[0].set_footer(
-                text=f"({self.current_page+1}/{len(self.embeds)})"
-            )
+        self.rest_calls = 0
+        self.current_page = 0
+        embed = await self.get_page(0)
+        self._set_footer(embed)
 
-        msg = await self.ctx.send(embed=self.embeds[0])
+        if self.use_buttons and COMPONENTS_AVAILABLE:
+            await self._run_buttons(embed)
+        else:
+            await self._run_reactions(embed)
 
-        for emoji in self.control_emojis:
+        self.current_page = 0
+        self.logger.debug(f"Paginator closed after {self.rest_calls} REST calls")
+
+    async def _run_buttons(self, embed: discord.Embed) -> None:
+        "One send, then exactly one interaction response per click"
+
+        view = discord.ui.View(timeout=self.timeout or None)  # type: ignore
+
+        async def interaction_check(interaction) -> bool:
+            return interaction.user == self.ctx.author
+
+        def make_callback(control: int):
+            async def callback(interaction) -> None:
+                self.rest_calls += 1
+                if control == 2:
+                    view.stop()
+                    await interaction.response.edit_message(view=None)
+                    return
+
+                page = await self._render(await self._target(control))
+                if page is None:
+                    await interaction.response.defer()
+                else:
+                    await interaction.response.edit_message(embed=page)
+
+            return callback
+
+        view.interaction_check = interaction_check  # type: ignore
+        for control, emoji in enumerate(self.control_emojis):
+            button = discord.ui.Button(emoji=emoji, style=discord.ButtonStyle.secondary)  # type: ignore
+            button.callback = make_callback(control)
+            view.add_item(button)
+
+        self.rest_calls += 1
+        msg = await self.ctx.send(embed=embed, view=view)  # type: ignore
+
+        # Returns on the close button or on timeout, only the timeout needs cleanup
+        if await view.wait():
             try:
-                await msg.add_reaction(emoji)
+                self.rest_calls += 1
+                await msg.edit(view=None)  # type: ignore
             except:
                 pass
 
-        msg = await msg.channel.fetch_message(msg.id)
+    async def _run_reactions(self, embed: discord.Embed) -> None:
+        "Fallback for libraries without message components"
 
-        def check(reaction: discord.Reaction, user: discord.User) -> bool:
-            return (
-                user == self.ctx.author
-                and reaction.message.id == msg.id
-                and str(reaction.emoji) in self.control_emojis
-            )
+        self.rest_calls += 1
+        msg = await self.ctx.send(embed=embed)
 
-        while True:
-            if self.timeout > 0:
+        with self.bot.reactions.open(
+            msg, self.ctx.author, self.control_emojis
+        ) as session:
+            for emoji in self.control_emojis:
                 try:
-                    reaction, user = await self.bot.wait_for(
-                        "reaction_add", check=check, timeout=self.timeout
-                    )
+                    self.rest_calls += 1
+                    await msg.add_reaction(emoji)
+                except:
+                    pass
+
+            while True:
+                try:
+                    reaction, user = await session.wait(timeout=self.timeout or None)
                 except asyncio.TimeoutError:
-                    self.current_page = 0
-                    for reaction in msg.reactions:
-                        if reaction.message.author.id == self.bot.user.id:
-                            try:
-                                await msg.remove_reaction(
-                                    str(reaction.emoji), reaction.message.author
-                                )
-                            except:
-                                pass
+                    await self._remove_controls(msg)
+                    break
+
+                control = self.control_emojis.index(str(reaction.emoji))
+                if control == 2:
+                    await self._remove_controls(msg)
                     break
-            else:
-                reaction: discord.Reaction
-                user: discord.User
-                reaction, user = await self.bot.wait_for("reaction_add", check=check)
 
-            if str(reaction.emoji) == self.control_emojis[0]:
-                self.current_page = 0
-                if self.remove_reactions:
-                    try:
-                        await msg.remove_reaction(str(reaction.emoji), user)
-                    except:
-                        pass
-                if self.auto_footer:
-                    self.embeds[0].set_footer(
-                        text=f"({self.current_page+1}/{len(self.embeds)})"
-                    )
-                await msg.edit(embed=self.embeds[0])
-
-            elif str(reaction.emoji) == self.control_emojis[1]:
-                self.current_page = self.current_page - 1
-                self.current_page = 0 if self.current_page < 0 else self.current_page
-                if self.remove_reactions:
-                    try:
-                        await msg.remove_reaction(str(reaction.emoji), user)
-                    except:
-                        pass
-                if self.auto_footer:
-                    self.embeds[self.current_page].set_footer(
-                        text=f"({self.current_page+1}/{len(self.embeds)})"
-                    )
-                await msg.edit(embed=self.embeds[self.current_page])
-
-            elif str(reaction.emoji) == self.control_emojis[2]:
-                self.current_page = 0
-                for reaction in msg.reactions:
-                    try:
-                        if reaction.message.author.id == self.bot.user.id:
-                            await msg.remove_reaction(
-                                str(reaction.emoji), reaction.message.author
-                            )
-                    except:
-                        pass
-                break
-
-            elif str(reaction.emoji) == self.control_emojis[3]:
-                self.current_page = self.current_page + 1
-                self.current_page = (
-                    len(self.embeds) - 1
-                    if self.current_page > len(self.embeds) - 1
-                    else self.current_page
-                )
-                if self.remove_reactions:
-                    try:
-                        await msg.remove_reaction(str(reaction.emoji), user)
-                    except:
-                        pass
-                if self.auto_footer:
-                    self.embeds[self.current_page].set_footer(
-                        text=f"({self.current_page+1}/{len(self.embeds)})"
-                    )
-                await msg.edit(embed=self.embeds[self.current_page])
-
-            elif str(reaction.emoji) == self.control_emojis[4]:
-                self.current_page = len(self.embeds) - 1
                 if self.remove_reactions:
                     try:
+                        self.rest_calls += 1
                         await msg.remove_reaction(str(reaction.emoji), user)
                     except:
                         pass
-                if self.auto_footer:
-                    self.embeds[len(self.embeds) - 1].set_footer(
-                        text=f"({self.current_page+1}/{len(self.embeds)})"
-                    )
-                await msg.edit(embed=self.embeds[len(self.embeds) - 1])
+
+                await self.show(msg, await self._target(control))
+
+    async def _remove_controls(self, msg: discord.Message) -> None:
+        for emoji in self.control_emojis:
+            try:
+                self.rest_calls += 1
+                await msg.remove_reaction(emoji, self.bot.user)
+            except:
+                pass
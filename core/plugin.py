@@ -1,8 +1,12 @@
+import ast
+import asyncio
+import importlib
+import json
 import logging
 import os
-from typing import TYPE_CHECKING
+import time
+from typing import TYPE_CHECKING, Optional
 
-import requests
 import termcolor
 from discord.ext.commands.errors import (
     ExtensionFailed,
@@ -11,16 +15,29 @@ from discord.ext.commands.errors import (
     NoEntryPointError,
 )
 from models.plugins import PluginData, PluginFiles
-from sqlmodel import select
+from sqlmodel import select, update
+
+from core.downloader import Downloader, hash_file
+from core.manifest import CommandInfo, scan_commands
 
 if TYPE_CHECKING:
     from main import ModularBot
 
+# Top level packages `preload` never imports, the bot entry point and the plugins
+PRELOAD_SKIP = {"__main__", "main", "plugins"}
+
 
 class Plugin:
     "Plugin for Discord bot, manages the state and files"
 
-    def __init__(self, plugin_data: PluginData, bot: "ModularBot") -> None:
+    def __init__(
+        self,
+        plugin_data: PluginData,
+        bot: "ModularBot",
+        files: list[PluginFiles],
+        dependencies: Optional[list[int]] = None,
+        local_files: Optional[list[str]] = None,
+    ) -> None:
 
         # Plugin data
         self.version: str = plugin_data.version
@@ -29,7 +46,10 @@ class Plugin:
         self.author: str = plugin_data.author
         self.folder_name: str = plugin_data.folder_name
         self.enabled: bool = plugin_data.enabled
+        self.lazy: bool = plugin_data.lazy
+        self.isolated: bool = plugin_data.isolated
         self.id: int = plugin_data.id
+        self.dependencies: list[int] = dependencies or []
 
         # Logger
         self.logger = logging.getLogger("plugin." + self.name)
@@ -38,23 +58,24 @@ class Plugin:
         self.bot: "ModularBot" = bot
 
         # Check if plugin folder exists, if not, create it
-        if not os.path.exists(f"plugins/{self.folder_name}"):
+        if local_files is None and not os.path.exists(f"plugins/{self.folder_name}"):
             os.mkdir(f"plugins/{self.folder_name}")
 
-        # Get all files required for this plugin
-        self.files: dict[str, str] = self._get_files()
+        # All files required for this plugin, {file: url} and {file: expected hash}
+        self.files: dict[str, str] = {i.file: i.file_url for i in files}
+        self.hashes: dict[str, Optional[str]] = {i.file: i.content_hash for i in files}
         self.empty: bool = len(self.files) == 0
-        self.local, self.non_local_files, self.local_files = self._exists_localy()
+        # Files known to be present (from the plugin snapshot) are not checked again
+        if local_files is None:
+            self.local, self.non_local_files, self.local_files = self._exists_localy()
+        else:
+            self.local, self.non_local_files, self.local_files = True, [], local_files
 
         # If no files are found and can't be downloaded, disable the plugin
         if self.empty:
             self.logger.warning(f"{self.name} has no files, it will not be loaded")
             self.enabled = False
 
-        # If files are missing and can be downloaded, download them
-        if not self.local and not self.empty and not self.enabled:
-            self._download()
-
     def __repr__(self) -> str:
         return (
             f"Plugin(name={self.name}, version={self.version}, enabled={self.enabled})"
@@ -70,47 +91,122 @@ class Plugin:
 
         return f'plugins.{self.folder_name}.{path.replace(".py", "").replace(" ", "_").replace("-", "_").replace(".", "_").replace("/", ".")}'
 
-    def _download(self) -> None:
-        "Downloads the necessary files for this plugin"
+    def path(self, file: str) -> str:
+        return f"plugins/{self.folder_name}/{file}"
 
-        try:
-            self.logger.info(
-                termcolor.colored(
-                    f"Downloading files for plugin `{self.name}`", "yellow"
-                )
-            )
+    def _outdated_files(self) -> list[tuple[str, str]]:
+        "Files that are missing or whose content does not match the expected hash"
+
+        outdated = list(self.non_local_files)
+        for file in self.local_files:
+            expected = self.hashes.get(file)
+            if expected is not None and hash_file(self.path(file)) != expected.lower():
+                self.logger.warning(f"{file} does not match its hash, downloading it")
+                outdated.append((file, self.files[file]))
+
+        return outdated
 
-            for file in self.non_local_files:
-                file, link = file[0], file[1]
-                self.logger.info(f"Downloading {file}")
+    async def download(self, downloader: Downloader) -> bool:
+        "Downloads missing and changed files, returns False if some could not be downloaded"
 
-                r = requests.get(link)
+        loop = asyncio.get_running_loop()
+        outdated = await loop.run_in_executor(None, self._outdated_files)
+        if not outdated:
+            if not os.path.exists(self._state_path()):
+                self._write_state()
+            return True
 
-                os.makedirs(
-                    os.path.dirname(f"plugins/{self.folder_name}/{file}"), exist_ok=True
-                )  # Make all necessary folders
+        self.logger.info(
+            termcolor.colored(f"Downloading files for plugin `{self.name}`", "yellow")
+        )
 
-                with open(
-                    f"plugins/{self.folder_name}/{file}", "wb"
-                ) as f:  # Download the file
-                    f.write(r.content)
+        results = await downloader.download_all(
+            (link, self.path(file), self.hashes.get(file)) for file, link in outdated
+        )
 
+        ok = True
+        for (file, _), result in zip(outdated, results):
+            if isinstance(result, BaseException):
+                ok = False
+                self.logger.error(
+                    termcolor.colored(f"Could not download {file}: {result}", "red")
+                )
+            else:
                 self.logger.info(termcolor.colored(f"Downloaded {file}", "green"))
-                self.local_files.append(file)
+        self.bot.reloader.mark_synced([self.path(file) for file, _ in outdated])
 
-        except ConnectionError as e:
-            self.logger.error(
-                termcolor.colored(f"Could not download {self.name}: {e}", "red")
-            )
+        self.local, self.non_local_files, self.local_files = self._exists_localy()
+        if ok:
+            self._write_state()
+        return ok
+
+    @property
+    def extension_files(self) -> list[str]:
+        "Local python files, each one is loaded as an extension"
+
+        return [i for i in self.local_files if i.endswith(".py")]
+
+    def preload(self) -> float:
+        """Imports the modules the plugin files import, returns the time it took
+
+        Safe to run in a thread, the plugin files themselves are not executed so `load`
+        only has to run the plugin code on the event loop. Only unconditional top level
+        imports are followed, imports under `if TYPE_CHECKING:`, in try blocks or in
+        functions may never run, and other plugins and the bot itself are left to `load`.
+        """
+
+        start = time.perf_counter()
+        for file in self.extension_files:
+            try:
+                with open(self.path(file), "r", encoding="utf-8") as f:
+                    tree = ast.parse(f.read())
+            except (OSError, SyntaxError, ValueError):
+                continue  # load reports the error
+
+            for node in tree.body:
+                if isinstance(node, ast.Import):
+                    names = [i.name for i in node.names]
+                elif (
+                    isinstance(node, ast.ImportFrom) and node.level == 0 and node.module
+                ):
+                    names = [node.module]
+                else:
+                    continue
+
+                for name in names:
+                    if name.split(".")[0] in PRELOAD_SKIP:
+                        continue
+                    try:
+                        importlib.import_module(name)
+                    except Exception:
+                        pass  # load reports the error
+
+        return time.perf_counter() - start
+
+    def manifest(self) -> list[CommandInfo]:
+        "Commands declared in the plugin files, found without importing them"
+
+        commands: list[CommandInfo] = []
+        for file in self.extension_files:
+            try:
+                with open(self.path(file), "r", encoding="utf-8") as f:
+                    commands.extend(scan_commands(f.read(), file))
+            except (OSError, SyntaxError, ValueError) as e:
+                self.logger.error(f"Could not scan {file} for commands: {e}")
+
+        return commands
 
     def load(self) -> bool:
-        "Loads the plugin files"
+        "Loads the plugin files, returns False if some of them could not be loaded"
 
         if self.enabled:
             self.logger.info(f"Loading plugin {self.name}")
-            self.logger.debug(f"Files: {self.local_files}")
+            self.logger.debug(f"Files: {self.extension_files}")
 
-            for pythonpath in [self.generate_safe_path(i) for i in self.local_files]:
+            failed: list[str] = []
+            for pythonpath in [
+                self.generate_safe_path(i) for i in self.extension_files
+            ]:
                 self.logger.debug(f"Loading file {pythonpath}")
                 try:
                     self.bot.load_extension(pythonpath)
@@ -120,11 +216,18 @@ class Plugin:
                     ExtensionNotLoaded,
                     NoEntryPointError,
                 ) as e:
-                    self.enabled = False
+                    failed.append(pythonpath)
                     self.logger.error(
                         f"{type(e).__name__}: Could not load {pythonpath}"
                     )
-                    return False
+
+            if failed:
+                self.logger.error(
+                    termcolor.colored(
+                        f"Plugin {self.name} loaded without {failed}", "red"
+                    )
+                )
+                return False
 
             self.logger.info(termcolor.colored(f"Loaded plugin {self.name}", "green"))
             return True
@@ -138,12 +241,19 @@ class Plugin:
 
         try:
             self.logger.info(f"Unloading plugin {self.name}")
-            self.logger.debug(f"Files: {self.local_files}")
+            self.logger.debug(f"Files: {self.extension_files}")
+
+            for pythonpath in [
+                self.generate_safe_path(i) for i in self.extension_files
+            ]:
+                if pythonpath not in self.bot.extensions:
+                    continue  # Failed to load
 
-            for pythonpath in [self.generate_safe_path(i) for i in self.local_files]:
                 self.logger.debug(f"Unloading file {pythonpath}")
                 self.bot.unload_extension(pythonpath)
 
+            self.bot.task_handlers.unregister_module(f"plugins.{self.folder_name}.")
+
             return True
 
         except (ExtensionNotFound, ExtensionNotLoaded) as e:
@@ -153,14 +263,16 @@ class Plugin:
             )
             return False
 
-    def reload(self) -> bool:
-        "Reloads the plugin files"
+    def reload(self, files: Optional[list[str]] = None) -> bool:
+        "Reloads the plugin files, only the given ones if provided"
+
+        files = self.extension_files if files is None else files
 
         try:
             self.logger.info(f"Reloading plugin {self.name}")
-            self.logger.debug(f"Files: {self.local_files}")
+            self.logger.debug(f"Files: {files}")
 
-            for pythonpath in [self.generate_safe_path(i) for i in self.local_files]:
+            for pythonpath in [self.generate_safe_path(i) for i in files]:
                 self.logger.debug(f"Reloading file {pythonpath}")
                 self.bot.reload_extension(pythonpath)
 
@@ -178,25 +290,25 @@ class Plugin:
             )
             return False
 
-    def enable(self) -> None:
+    async def enable(self) -> None:
         self.enabled = True
-        self.bot.database.query(PluginData).filter_by(id=self.id).update(
-            {PluginData.enabled: True}
-        )
+        await self._set_enabled(True)
 
-    def disable(self) -> None:
+    async def disable(self) -> None:
         self.enabled = False
-        self.bot.database.query(PluginData).filter_by(id=self.id).update(
-            {PluginData.enabled: False}
-        )
-
-    def _get_files(self) -> dict[str, str]:
-        "Populates all files required for this plugin"
+        await self._set_enabled(False)
+
+    async def _set_enabled(self, enabled: bool) -> None:
+        async with self.bot.session() as session:
+            await session.execute(
+                update(PluginData)
+                .where(PluginData.id == self.id)
+                .values(enabled=enabled)
+            )
+            await session.commit()
 
-        plugin_files = self.bot.database.exec(
-            select(PluginFiles).where(PluginFiles.plugin_id == self.id)
-        ).all()
-        return {file.file: file.file_url for file in plugin_files}
+        # The snapshot still has the old flag, the next start has to read the database
+        self.bot.plugin_handler.snapshot.invalidate()
 
     def _exists_localy(self) -> tuple[bool, list[tuple[str, str]], list[str]]:
         "Checks if the plugin is installed locally, if not, returns a list of tuples (file: str, url: str) that are missing"
@@ -208,7 +320,7 @@ class Plugin:
         for file in self.files:
             link = self.files[file]
 
-            if not os.path.exists(f"plugins/{self.folder_name}/{file}"):
+            if not os.path.exists(self.path(file)):
                 non_local_files.append((file, link))
                 local = False
             else:
@@ -216,14 +328,157 @@ class Plugin:
 
         return local, non_local_files, local_files
 
-    def update(self):
-        # TODO: Update the plugin
+    async def update(self) -> bool:
+        """Syncs the plugin with its database entry
+
+        Only files whose hash changed (or all files with an unknown hash, if the version
+        changed) are downloaded, files no longer listed are removed and only the affected
+        extensions are reloaded.
+        """
+
+        async with self.bot.session() as session:
+            data = await session.get(PluginData, self.id)
+            files = (
+                await session.exec(
+                    select(PluginFiles).where(PluginFiles.plugin_id == self.id)
+                )
+            ).all()
+
+        if data is None:
+            self.logger.error(f"Plugin {self.name} is no longer in the database")
+            return False
+
+        if (data.enabled, data.lazy, data.isolated) != (
+            self.enabled,
+            self.lazy,
+            self.isolated,
+        ):
+            self.logger.warning(
+                f"Flags of plugin {self.name} changed, only the files are updated, "
+                "restart to apply them"
+            )
+
+        state = self._read_state()
+        known: dict[str, Optional[str]] = state.get("files", {})
+        version_changed = data.version != state.get("version", self.version)
+
+        changed = await asyncio.get_running_loop().run_in_executor(
+            None, self._changed_files, files, known, version_changed
+        )
+        listed = {i.file for i in files}
+        removed = [i for i in set(known) | set(self.files) if i not in listed]
+
+        if not changed and not removed and not version_changed:
+            self.logger.info(f"Plugin {self.name} is up to date")
+            return True
+
+        self.logger.info(
+            f"Updating plugin {self.name} {self.version} -> {data.version}: "
+            f"{len(changed)} changed, {len(removed)} removed"
+        )
+
+        # Take removed modules out before their files disappear
+        for file in removed:
+            pythonpath = self.generate_safe_path(file)
+            if pythonpath in self.bot.extensions:
+                self.bot.unload_extension(pythonpath)
+            if os.path.exists(self.path(file)):
+                os.remove(self.path(file))
+
+        self.version = data.version
+        self.name = data.name
+        self.description = data.description
+        self.author = data.author
+        self.files = {i.file: i.file_url for i in files}
+        self.hashes = {i.file: i.content_hash for i in files}
+        self.empty = len(self.files) == 0
+
+        ok = True
+        if changed:
+            async with Downloader() as downloader:
+                results = await downloader.download_all(
+                    (self.files[i], self.path(i), self.hashes[i]) for i in changed
+                )
+            for file, result in zip(changed, results):
+                if isinstance(result, BaseException):
+                    ok = False
+                    self.logger.error(f"Could not download {file}: {result}")
+        self.bot.reloader.mark_synced([self.path(i) for i in changed + removed])
+
+        self.local, self.non_local_files, self.local_files = self._exists_localy()
+        if ok:
+            self._write_state()
+
+        if self.enabled and self.bot.plugin_handler.lazy.pending(self.id):
+            self.bot.plugin_handler.lazy.refresh(self)
+        elif self.enabled and self.bot.plugin_handler.isolated.handles(self.id):
+            self.bot.plugin_handler.isolated.refresh(self)
+        elif self.enabled:
+            loaded = [
+                i for i in changed if self.generate_safe_path(i) in self.bot.extensions
+            ]
+            added = [
+                i
+                for i in changed
+                if i.endswith(".py")
+                and i in self.local_files
+                and self.generate_safe_path(i) not in self.bot.extensions
+            ]
+
+            if loaded:
+                ok = self.reload(loaded) and ok
+            for file in added:
+                try:
+                    self.bot.load_extension(self.generate_safe_path(file))
+                except (ExtensionFailed, ExtensionNotFound, NoEntryPointError) as e:
+                    ok = False
+                    self.logger.error(f"{type(e).__name__}: Could not load {file}")
+
+        return ok
+
+    def _changed_files(
+        self,
+        files: list[PluginFiles],
+        known: dict[str, Optional[str]],
+        version_changed: bool,
+    ) -> list[str]:
+        "Files whose content differs from the database entry"
+
+        changed: list[str] = []
+        for i in files:
+            if not os.path.exists(self.path(i.file)):
+                changed.append(i.file)
+            elif i.content_hash is None:
+                # Without a hash only a version bump tells that the file changed
+                if version_changed:
+                    changed.append(i.file)
+            elif i.file in known:
+                if known[i.file] != i.content_hash:
+                    changed.append(i.file)
+            elif hash_file(self.path(i.file)) != i.content_hash.lower():
+                changed.append(i.file)
+
+        return changed
+
+    def _state_path(self) -> str:
+        return f"plugins/{self.folder_name}/.state.json"
+
+    def _read_state(self) -> dict:
+        "Version and file hashes of the last successful sync, empty if never synced"
+
+        try:
+            with open(self._state_path(), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
 
-        raise NotImplementedError
+    def _write_state(self) -> None:
+        with open(self._state_path(), "w") as f:
+            json.dump({"version": self.version, "files": self.hashes}, f)
 
     def get_requirements(self) -> list[str]:
-        if os.path.exists(f"plugins/{self.folder_name}/requirements.txt"):
-            with open(f"plugins/{self.folder_name}/requirements.txt", "r") as f:
+        if os.path.exists(self.path("requirements.txt")):
+            with open(self.path("requirements.txt"), "r") as f:
                 return f.read().splitlines()
         else:
             return []
@@ -1,13 +1,28 @@
+import asyncio
 import importlib
 import logging
-import subprocess
+import os
 import sys
-from typing import TYPE_CHECKING
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
 
-from models.plugins import PluginData
+from models.plugins import PluginData, PluginDependencies, PluginFiles
+from packaging.requirements import Requirement
 from sqlmodel import select
 
+from core.downloader import Downloader
+from core.lazy import LazyLoader
 from core.plugin import Plugin
+from core.profiler import PluginProfiler
+from core.requirements import (
+    RequirementsCache,
+    hash_requirements,
+    missing_requirements,
+    parse_requirements,
+)
+from core.snapshot import PluginEntry, PluginSnapshot, load_state, serialize_entry
+from core.worker import IsolatedPlugins
 
 if TYPE_CHECKING:
     from main import ModularBot
@@ -16,19 +31,164 @@ if TYPE_CHECKING:
 class PluginHandler:
     "Takes care of managing all the installed plugins"
 
-    def __init__(self, bot: "ModularBot") -> None:
+    def __init__(
+        self,
+        bot: "ModularBot",
+        wheelhouse: str = "plugins/.wheelhouse",
+        lazy_idle_timeout: Optional[float] = None,
+        trace_memory: bool = False,
+    ) -> None:
         self.logger = logging.getLogger("plugin-handler")
         self.bot = bot
-        self.plugin_data = self._find_plugin_data()
+        self.wheelhouse = wheelhouse
+        self.plugin_data: list[PluginData] = []
+        self.requirements_cache = RequirementsCache("plugins/.requirements-cache.json")
 
-    def _find_plugin_data(self) -> list[PluginData]:
-        return self.bot.database.exec(select(PluginData)).all()
+        # Plugin rows and file state of the last full sync, used on warm starts
+        self.snapshot = PluginSnapshot("plugins/.snapshot.json")
+        self.snapshot_entries: list[PluginEntry] = []
+        self._revalidation: Optional[asyncio.Task] = None
+
+        # Seconds spent loading every plugin, filled by load_all_plugins
+        self.load_report: dict[str, float] = {}
+
+        # Command stubs of lazy plugins, the plugins get loaded on first use
+        self.lazy = LazyLoader(bot, idle_timeout=lazy_idle_timeout)
+
+        # Plugins whose commands run in worker processes
+        self.isolated = IsolatedPlugins(bot)
+
+        # Time and memory used by every plugin
+        self.profiler = PluginProfiler(bot, trace_memory=trace_memory)
+
+    async def _find_plugin_data(self) -> list[PluginEntry]:
+        "Data, files and dependencies of all plugins, files are fetched with one joined query"
+
+        async with self.bot.session() as session:
+            rows = (
+                await session.exec(
+                    select(PluginData, PluginFiles)
+                    .outerjoin(PluginFiles, PluginFiles.plugin_id == PluginData.id)
+                    .order_by(PluginData.id)
+                )
+            ).all()
+            dependency_rows = (await session.exec(select(PluginDependencies))).all()
+
+        dependencies: dict[int, list[int]] = {}
+        for row in dependency_rows:
+            dependencies.setdefault(row.plugin_id, []).append(row.dependency_id)
+
+        entries: dict[int, PluginEntry] = {}
+        for data, file in rows:
+            if data.id not in entries:
+                entries[data.id] = PluginEntry(data, [], dependencies.get(data.id, []))
+            if file is not None:
+                entries[data.id].files.append(file)
+
+        return list(entries.values())
+
+    async def populate_plugins(self) -> None:
+        """Creates the plugins, downloads missing and changed files
+
+        On a warm start with unchanged plugin files the plugins are created from the
+        snapshot of the last sync, the database is checked later in the background.
+        """
 
-    def populate_plugins(self) -> None:
         self.logger.debug("Populating plugin list")
+        loop = asyncio.get_running_loop()
+
+        entries = await loop.run_in_executor(None, self.snapshot.load)
+        if entries is not None:
+            self.logger.info("Plugin files unchanged, using the plugin snapshot")
+            self.snapshot_entries = entries
+            self._create_plugins(entries, trusted=True)
+            self._revalidation = loop.create_task(self.revalidate_snapshot())
+            return
+
+        entries = await self._find_plugin_data()
+        self._create_plugins(entries)
+
+        # Missing and changed files of all plugins are downloaded concurrently
+        async with Downloader() as downloader:
+            results = await asyncio.gather(
+                *(
+                    plugin.download(downloader)
+                    for plugin in self.bot.plugins
+                    if not plugin.empty
+                )
+            )
+
+        if all(results):
+            await loop.run_in_executor(None, self.snapshot.save, entries)
+
+        self.logger.info(f"Plugins: {[i.name for i in self.bot.plugins]}")
+
+    def _create_plugins(
+        self, entries: list[PluginEntry], trusted: bool = False
+    ) -> None:
+        "Creates the plugins, `trusted` skips checking which files exist locally"
 
-        for data in self.plugin_data:
-            self.bot.plugins.append(Plugin(data, self.bot))
+        self.plugin_data = [entry.data for entry in entries]
+        for entry in entries:
+            self.bot.plugins.append(
+                Plugin(
+                    entry.data,
+                    self.bot,
+                    entry.files,
+                    entry.dependencies,
+                    local_files=[i.file for i in entry.files] if trusted else None,
+                )
+            )
+
+    async def revalidate_snapshot(self) -> None:
+        """Compares the snapshot the plugins were created from with the database
+
+        Changed files are updated in place. If plugins were added or removed, or
+        their flags or dependencies changed, the plugins were loaded the wrong way and
+        are set up again from the database. The snapshot is replaced either way.
+        """
+
+        await self.bot.startup.wait()
+
+        entries = await self._find_plugin_data()
+        current = {entry.data.id: entry for entry in entries}
+        known = {entry.data.id: entry for entry in self.snapshot_entries}
+
+        if current.keys() != known.keys() or any(
+            load_state(current[i]) != load_state(known[i]) for i in current
+        ):
+            self.logger.warning(
+                "Plugins changed since the plugin snapshot, loading them again"
+            )
+            await self.cold_start()
+            return
+
+        ok = True
+        for plugin in self.bot.plugins:
+            if serialize_entry(current[plugin.id]) != serialize_entry(known[plugin.id]):
+                ok = await plugin.update() and ok
+
+        if ok:
+            self.logger.info("Plugin snapshot matches the database")
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.snapshot.save, entries
+            )
+        else:
+            self.snapshot.invalidate()
+
+    async def cold_start(self) -> None:
+        "Unloads all plugins and creates, downloads and loads them from the database"
+
+        self.snapshot.invalidate()
+        for plugin in self.bot.plugins:
+            self.lazy.forget(plugin.id)
+            self.isolated.forget(plugin.id)
+        self.unload_all_plugins()
+        self.bot.plugins.clear()
+
+        await self.populate_plugins()
+        await self.install_requirements()
+        await self.load_all_plugins()
 
     def reload_all_plugins(self) -> None:
         self.logger.debug("Reloading plugin data of all plugins")
@@ -36,40 +196,218 @@ class PluginHandler:
         for plugin in self.bot.plugins:
             plugin.reload()
 
-    def load_all_plugins(self) -> None:
+    def _dependency_levels(self) -> list[list[Plugin]]:
+        """Groups plugins so that every plugin comes after all of its dependencies
+
+        Plugins in one group don't depend on each other. Plugins with unknown
+        dependencies or in a dependency cycle are left out.
+        """
+
+        plugins = {plugin.id: plugin for plugin in self.bot.plugins}
+        pending: dict[int, set[int]] = {}
+        dependents: dict[int, list[int]] = {}
+
         for plugin in self.bot.plugins:
-            plugin.load()
+            unknown = [i for i in plugin.dependencies if i not in plugins]
+            if unknown:
+                self.logger.error(
+                    f"Plugin {plugin.name} depends on unknown plugins {unknown}, not loading"
+                )
+                continue
+
+            pending[plugin.id] = set(plugin.dependencies)
+            for dependency in plugin.dependencies:
+                dependents.setdefault(dependency, []).append(plugin.id)
+
+        levels: list[list[Plugin]] = []
+        ready = [i for i, deps in pending.items() if not deps]
+        while ready:
+            levels.append([plugins[i] for i in ready])
+            next_ready: list[int] = []
+            for plugin_id in ready:
+                del pending[plugin_id]
+                for dependent in dependents.get(plugin_id, []):
+                    if dependent in pending:
+                        pending[dependent].discard(plugin_id)
+                        if not pending[dependent]:
+                            next_ready.append(dependent)
+            ready = next_ready
+
+        for plugin_id in pending:
+            self.logger.error(
+                f"Plugin {plugins[plugin_id].name} is part of a dependency cycle or "
+                "depends on one, not loading"
+            )
+
+        return levels
+
+    async def load_all_plugins(self, workers: int = 4) -> None:
+        """Loads plugins level by level in dependency order
+
+        Modules imported by the plugins of one level are imported concurrently in a thread
+        pool, the extensions are then registered one by one on the event loop. Lazy and
+        isolated plugins only get their command stubs registered, unless another plugin
+        depends on them.
+        """
+
+        loop = asyncio.get_running_loop()
+        loaded: set[int] = set()
+        self.load_report = {}
+        required = {
+            dependency
+            for plugin in self.bot.plugins
+            if plugin.enabled
+            for dependency in plugin.dependencies
+        }
+
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="plugin-import"
+        ) as pool:
+            for level in self._dependency_levels():
+                runnable: list[Plugin] = []
+                for plugin in level:
+                    if not plugin.enabled:
+                        self.logger.info(
+                            f"Plugin {plugin.name} is disabled, not loading"
+                        )
+                    elif not all(i in loaded for i in plugin.dependencies):
+                        self.logger.error(
+                            f"Dependencies of {plugin.name} are not loaded, not loading"
+                        )
+                    else:
+                        runnable.append(plugin)
+
+                stubbed = [
+                    i
+                    for i in runnable
+                    if (i.lazy or i.isolated) and i.id not in required
+                ]
+                eager = [i for i in runnable if i not in stubbed]
+
+                manifests = await asyncio.gather(
+                    *(loop.run_in_executor(pool, plugin.manifest) for plugin in stubbed)
+                )
+                for plugin, manifest in zip(stubbed, manifests):
+                    if plugin.isolated:
+                        self.isolated.register(plugin, manifest)
+                    else:
+                        self.lazy.register(plugin, manifest)
+                    loaded.add(plugin.id)
+
+                imports = await asyncio.gather(
+                    *(loop.run_in_executor(pool, plugin.preload) for plugin in eager)
+                )
+
+                for plugin, import_time in zip(eager, imports):
+                    start = time.perf_counter()
+                    if plugin.load():
+                        loaded.add(plugin.id)
+                    self.load_report[plugin.name] = (
+                        import_time + time.perf_counter() - start
+                    )
+
+        for name, seconds in sorted(
+            self.load_report.items(), key=lambda i: i[1], reverse=True
+        ):
+            self.logger.info(f"Plugin {name} loaded in {seconds * 1000:.1f} ms")
 
     def unload_all_plugins(self) -> None:
         for plugin in self.bot.plugins:
             plugin.unload()
+        self.isolated.shutdown()
 
-    @property
-    def requirements(self) -> list[str]:
-        # Get all requirements for pip packages from all plugins
+    def _read_requirements(self) -> dict[str, tuple[str, list[str]]]:
+        "Requirements files of all plugins as {cache key: (path, lines)}"
 
-        req: list[str] = []
+        files: dict[str, tuple[str, list[str]]] = {}
         for plugin in self.bot.plugins:
-            recieved = plugin.get_requirements()
-            for requirement in recieved:
-                if not requirement in req:
-                    req.append(requirement)
-
-        return req
-
-    def install_requirements(self) -> None:
-        "Installs all requirements that plugins require"
-
-        try:
-            for i in self.requirements:
-                importlib.import_module(i)
-        except ImportError:
-            logging.warning("Some requirements not found, installing them")
-            extended = (
-                "\\Scripts\\python.exe" if sys.platform == "win32" else "\\bin\\python"
-            )
-            command = subprocess.Popen(
-                f"{sys.prefix+extended} -m pip install {' '.join(self.requirements)}",
-                shell=True,
-            )
-            command.wait()
+            path = plugin.path("requirements.txt")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    content = f.read()
+                files[hash_requirements(content)] = (
+                    path,
+                    content.decode().splitlines(),
+                )
+
+        return files
+
+    def _resolve_requirements(self) -> tuple[list[str], list[str], list[str]]:
+        """Returns cache keys of files that were not resolved yet, requirements missing
+        from them and files pip has to read itself
+
+        Files with lines that are not plain requirements are handed to pip as they are
+        and are never cached as satisfied.
+        """
+
+        keys: list[str] = []
+        requirements: list[Requirement] = []
+        files: list[str] = []
+        for key, (path, lines) in self._read_requirements().items():
+            if self.requirements_cache.satisfied(key):
+                continue
+
+            parsed, unparsed = parse_requirements(lines)
+            if unparsed:
+                files.append(path)
+            else:
+                keys.append(key)
+                requirements.extend(parsed)
+
+        return keys, missing_requirements(requirements), files
+
+    async def _pip(self, *args: str) -> bool:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "pip", *args
+        )
+        return await process.wait() == 0
+
+    async def _install_from_wheelhouse(self, requirements: list[str]) -> bool:
+        """Installs offline from the wheelhouse, builds the missing wheels into it first if needed
+
+        Wheels are downloaded and built only once, later installs (also after restarts
+        of the container) are a local operation that works without network.
+        """
+
+        os.makedirs(self.wheelhouse, exist_ok=True)
+        offline = ("install", "--no-index", "--find-links", self.wheelhouse)
+
+        if os.listdir(self.wheelhouse) and await self._pip(*offline, *requirements):
+            self.logger.info("Requirements installed from the wheelhouse")
+            return True
+
+        self.logger.info("Wheelhouse incomplete, downloading and building wheels")
+        if not await self._pip("wheel", "--wheel-dir", self.wheelhouse, *requirements):
+            return False
+
+        return await self._pip(*offline, *requirements)
+
+    async def install_requirements(self) -> bool:
+        "Installs all requirements that plugins require, only the missing ones in one pip call"
+
+        loop = asyncio.get_running_loop()
+        keys, missing, files = await loop.run_in_executor(
+            None, self._resolve_requirements
+        )
+
+        if missing:
+            self.logger.warning(f"Some requirements not found, installing {missing}")
+            if not await self._install_from_wheelhouse(missing):
+                self.logger.error("Could not install plugin requirements")
+                return False
+
+        for path in files:
+            self.logger.info(f"{path} has entries only pip can resolve, installing it")
+            if not await self._pip("install", "-r", path):
+                self.logger.error(f"Could not install requirements from {path}")
+                return False
+
+        if missing or files:
+            importlib.invalidate_caches()
+
+        for key in keys:
+            self.requirements_cache.add(key)
+        if keys:
+            self.requirements_cache.save()
+
+        return True
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Coroutine, Optional
+
+from discord.ext import tasks
+
+if TYPE_CHECKING:
+    from main import ModularBot
+
+    from core.plugin import Plugin
+
+KINDS = ("command", "listener", "task")
+
+
+class PluginUsage:
+    """Resources used by one plugin
+
+    Attributes:
+        `time`: Seconds the plugin code ran on the event loop, by kind
+        `calls`: Finished commands, listeners and tasks, by kind
+        `memory`: Bytes allocated by the plugin code that are still alive, needs memory tracing
+    """
+
+    def __init__(self) -> None:
+        self.time: dict[str, float] = {kind: 0.0 for kind in KINDS}
+        self.calls: dict[str, int] = {kind: 0 for kind in KINDS}
+        self.memory: int = 0
+
+    def as_dict(self) -> dict:
+        return {"time": self.time, "calls": self.calls, "memory": self.memory}
+
+
+class _Timed:
+    """Awaitable that adds the time spent in every step of the coroutine to the usage
+
+    Time the coroutine spends suspended (waiting for IO, sleeping) is not counted, only
+    the time it occupies the event loop.
+    """
+
+    def __init__(self, coro: Coroutine, usage: PluginUsage, kind: str) -> None:
+        self.coro = coro
+        self.usage = usage
+        self.kind = kind
+
+    def __await__(self):
+        steps = self.coro.__await__()
+        value: Any = None
+        error: Optional[BaseException] = None
+
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    if error is None:
+                        future = steps.send(value)
+                    else:
+                        future = steps.throw(error)
+                except StopIteration as e:
+                    return e.value
+                finally:
+                    self.usage.time[self.kind] += time.perf_counter() - start
+
+                try:
+                    value, error = (yield future), None
+                except BaseException as e:
+                    value, error = None, e
+        finally:
+            self.usage.calls[self.kind] += 1
+
+
+class PluginProfiler:
+    """Attributes event loop time and memory to the plugins
+
+    Commands are measured by `ModularBot.invoke`, listeners by `ModularBot._run_event`,
+    tasks created from plugin code (including `discord.ext.tasks` loops) by a task factory.
+    Memory is taken from tracemalloc snapshots, filtered by allocations made from files
+    in `plugins/<folder_name>`. A JSON report is written periodically for the web server.
+
+    Attributes:
+        `bot`: The bot instance
+        `usage`: Usage of every plugin that ran some code, by plugin id
+        `trace_memory`: Whether tracemalloc is running, it slows down allocations noticeably
+        `report_path`: JSON file the report is written to
+        `report_interval`: Seconds between report writes
+
+    Example:
+        >>> profiler = PluginProfiler(bot, trace_memory=True)
+        >>> profiler.install()
+        >>> await profiler.measure(coro, plugin, "command")
+    """
+
+    def __init__(
+        self,
+        bot: "ModularBot",
+        trace_memory: bool = False,
+        report_path: str = "plugins/.profile.json",
+        report_interval: float = 60,
+        trace_frames: int = 16,
+    ) -> None:
+        self.logger = logging.getLogger("profiler")
+        self.bot = bot
+        self.trace_memory = trace_memory
+        self.trace_frames = trace_frames
+        self.report_path = report_path
+        self.report_interval = report_interval
+
+        self.usage: dict[int, PluginUsage] = {}
+
+        self._root = os.path.abspath("plugins") + os.sep
+        self._path_folders: dict[str, Optional[str]] = {}
+        self._reporter: Optional[asyncio.Task] = None
+
+    def install(self) -> None:
+        "Starts the task factory, memory tracing and the report writer on the running loop"
+
+        loop = asyncio.get_running_loop()
+        previous = loop.get_task_factory()
+
+        def factory(loop: asyncio.AbstractEventLoop, coro: Coroutine, **kwargs):
+            plugin = self.plugin_for_coroutine(coro)
+            if plugin is not None:
+                coro = self._task(coro, plugin)
+            if previous is not None:
+                return previous(loop, coro, **kwargs)
+            return asyncio.Task(coro, loop=loop, **kwargs)
+
+        loop.set_task_factory(factory)
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+
+        if self._reporter is None:
+            self._reporter = loop.create_task(self._write_reports())
+
+    def _folders(self) -> dict[str, "Plugin"]:
+        return {plugin.folder_name: plugin for plugin in self.bot.plugins}
+
+    def plugin_for_module(self, module: Optional[str]) -> Optional["Plugin"]:
+        "Plugin the module (`plugins.<folder_name>.<file>`) belongs to"
+
+        if not module or not module.startswith("plugins."):
+            return None
+        return self._folders().get(module.split(".", 2)[1])
+
+    def _path_folder(self, filename: str) -> Optional[str]:
+        if filename not in self._path_folders:
+            path = os.path.abspath(filename)
+            self._path_folders[filename] = (
+                path[len(self._root) :].split(os.sep, 1)[0]
+                if path.startswith(self._root)
+                else None
+            )
+        return self._path_folders[filename]
+
+    def plugin_for_path(self, filename: str) -> Optional["Plugin"]:
+        "Plugin the file (`plugins/<folder_name>/...`) belongs to"
+
+        folder = self._path_folder(filename)
+        return self._folders().get(folder) if folder is not None else None
+
+    def plugin_for_coroutine(self, coro: Coroutine) -> Optional["Plugin"]:
+        frame = getattr(coro, "cr_frame", None)
+        if frame is None:
+            return None
+
+        # Loops from discord.ext.tasks run the plugin coroutine from discord code
+        if frame.f_code is tasks.Loop._loop.__code__:
+            loop = frame.f_locals.get("self")
+            return self.plugin_for_module(
+                getattr(getattr(loop, "coro", None), "__module__", None)
+            )
+
+        return self.plugin_for_path(frame.f_code.co_filename)
+
+    def measure(self, coro: Coroutine, plugin: "Plugin", kind: str) -> Awaitable:
+        return _Timed(coro, self.usage.setdefault(plugin.id, PluginUsage()), kind)
+
+    def wrap(
+        self, function: Callable[..., Coroutine], plugin: "Plugin", kind: str
+    ) -> Callable[..., Awaitable]:
+        def wrapper(*args, **kwargs) -> Awaitable:
+            return self.measure(function(*args, **kwargs), plugin, kind)
+
+        return wrapper
+
+    async def _task(self, coro: Coroutine, plugin: "Plugin") -> Any:
+        return await self.measure(coro, plugin, "task")
+
+    def measure_memory(self) -> None:
+        "Updates memory usage of all plugins from a tracemalloc snapshot, slow, run in a thread"
+
+        if not tracemalloc.is_tracing():
+            return
+
+        memory: dict[str, int] = {}
+        for trace in tracemalloc.take_snapshot().traces:
+            for frame in trace.traceback:
+                folder = self._path_folder(frame.filename)
+                if folder is not None:
+                    memory[folder] = memory.get(folder, 0) + trace.size
+                    break
+
+        for plugin in self.bot.plugins:
+            self.usage.setdefault(plugin.id, PluginUsage()).memory = memory.get(
+                plugin.folder_name, 0
+            )
+
+    def report(self) -> dict:
+        return {
+            "generated": time.time(),
+            "trace_memory": tracemalloc.is_tracing(),
+            "plugins": {
+                plugin.name: self.usage.get(plugin.id, PluginUsage()).as_dict()
+                for plugin in self.bot.plugins
+            },
+        }
+
+    def write_report(self) -> None:
+        self.measure_memory()
+
+        partial = self.report_path + ".part"
+        with open(partial, "w") as f:
+            json.dump(self.report(), f)
+        os.replace(partial, self.report_path)
+
+    async def _write_reports(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.report_interval)
+            try:
+                await loop.run_in_executor(None, self.write_report)
+            except OSError as e:
+                self.logger.error(f"Could not write the plugin profile: {e}")
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, Union
+
+import discord
+
+if TYPE_CHECKING:
+    from main import ModularBot
+
+
+class ReactionSession:
+    """Reactions of one user on one message, fed by the `ReactionDispatcher`
+
+    Attributes:
+        `message_id`: Message the session listens on
+        `guild_id`: Guild of the message, None in private messages
+        `user_id`: The only user whose reactions are accepted
+        `emojis`: Accepted emojis
+        `expires_at`: `time.monotonic()` after which the session is closed
+    """
+
+    def __init__(
+        self,
+        message: discord.Message,
+        user: Union[discord.User, discord.Member],
+        emojis: Iterable[str],
+        lifetime: float,
+    ) -> None:
+        self.message_id: int = message.id
+        self.guild_id: Optional[int] = message.guild.id if message.guild else None
+        self.user_id: int = user.id
+        self.emojis: frozenset[str] = frozenset(emojis)
+        self.expires_at: float = time.monotonic() + lifetime
+        self.closed = False
+
+        # (reaction, user) pairs, None once the session is closed
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def feed(self, reaction: discord.Reaction, user: discord.User) -> None:
+        if user.id == self.user_id and str(reaction.emoji) in self.emojis:
+            self._queue.put_nowait((reaction, user))
+
+    def close(self) -> None:
+        "Wakes up the waiting coroutine, it gets asyncio.TimeoutError"
+
+        if not self.closed:
+            self.closed = True
+            self._queue.put_nowait(None)
+
+    async def wait(
+        self, timeout: Optional[float] = None
+    ) -> tuple[discord.Reaction, discord.User]:
+        "Waits for the next accepted reaction, raises asyncio.TimeoutError on timeout, expiry or close"
+
+        remaining = self.expires_at - time.monotonic()
+        if timeout is None or timeout > remaining:
+            timeout = remaining
+
+        if self.closed or timeout <= 0:
+            raise asyncio.TimeoutError
+
+        item = await asyncio.wait_for(self._queue.get(), timeout)
+        if item is None:
+            raise asyncio.TimeoutError
+        return item
+
+
+class ReactionDispatcher:
+    """Routes `on_reaction_add` events to the session that owns the message in O(1)
+
+    Replaces one `bot.wait_for("reaction_add", check=...)` per paginator or confirmation,
+    where every event was evaluated against every waiting check.
+
+    Attributes:
+        `bot`: The bot instance
+        `max_per_guild`: Concurrent sessions per guild, opening one more closes the oldest
+        `max_lifetime`: Seconds after which any session is closed
+
+    Example:
+        >>> with bot.reactions.open(msg, ctx.author, ["✅", "❌"]) as session:
+        >>>     reaction, user = await session.wait(timeout=20)
+    """
+
+    def __init__(
+        self, bot: "ModularBot", max_per_guild: int = 10, max_lifetime: float = 900
+    ) -> None:
+        self.logger = logging.getLogger("reactions")
+        self.bot = bot
+        self.max_per_guild = max_per_guild
+        self.max_lifetime = max_lifetime
+
+        self._sessions: dict[int, ReactionSession] = {}
+        # Sessions of every guild in the order they were opened
+        self._guilds: dict[Optional[int], OrderedDict[int, ReactionSession]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @contextmanager
+    def open(
+        self,
+        message: discord.Message,
+        user: Union[discord.User, discord.Member],
+        emojis: Iterable[str],
+        lifetime: Optional[float] = None,
+    ) -> Iterator[ReactionSession]:
+        "Registers a session for the message, it is closed when the `with` block exits"
+
+        self._sweep()
+
+        session = ReactionSession(
+            message, user, emojis, min(lifetime or self.max_lifetime, self.max_lifetime)
+        )
+        previous = self._sessions.get(session.message_id)
+        if previous is not None:
+            self.close(previous)
+
+        guild = self._guilds.setdefault(session.guild_id, OrderedDict())
+        while len(guild) >= self.max_per_guild:
+            oldest = next(iter(guild.values()))
+            self.logger.debug(
+                f"Too many sessions in guild {session.guild_id}, closing {oldest.message_id}"
+            )
+            self.close(oldest)
+            guild = self._guilds.setdefault(session.guild_id, OrderedDict())
+
+        self._sessions[session.message_id] = session
+        guild[session.message_id] = session
+        try:
+            yield session
+        finally:
+            self.close(session)
+
+    def close(self, session: ReactionSession) -> None:
+        session.close()
+
+        if self._sessions.get(session.message_id) is session:
+            del self._sessions[session.message_id]
+
+        guild = self._guilds.get(session.guild_id)
+        if guild is not None and guild.get(session.message_id) is session:
+            del guild[session.message_id]
+            if not guild:
+                del self._guilds[session.guild_id]
+
+    def _sweep(self) -> None:
+        "Closes expired sessions whose owners never waited on them again"
+
+        for session in [i for i in self._sessions.values() if i.expired]:
+            self.close(session)
+
+    async def on_reaction_add(
+        self, reaction: discord.Reaction, user: discord.User
+    ) -> None:
+        session = self._sessions.get(reaction.message.id)
+        if session is None:
+            return
+
+        if session.expired:
+            self.close(session)
+        else:
+            session.feed(reaction, user)
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Optional
+
+import termcolor
+from discord.ext.commands.errors import ExtensionError
+
+if TYPE_CHECKING:
+    from main import ModularBot
+
+    from core.plugin import Plugin
+
+
+def scan_sources(roots: tuple[str, ...]) -> dict[str, int]:
+    "Modification times of all python files under the roots, hidden folders are skipped"
+
+    mtimes: dict[str, int] = {}
+    pending = [i for i in roots if os.path.isdir(i)]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or entry.name == "__pycache__":
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.name.endswith(".py"):
+                    mtimes[entry.path] = entry.stat().st_mtime_ns
+
+    return mtimes
+
+
+class HotReloader:
+    """Reloads only the extensions and plugin files that changed on disk
+
+    Files are polled for their modification time once the startup pipeline finished.
+    Changes are collected until nothing changed for `debounce` seconds, so saving several
+    files at once reloads each of them only once. Files written by plugin syncs are
+    reported with `mark_synced`, the sync already loaded them.
+
+    Attributes:
+        `bot`: The bot instance
+        `roots`: Folders that are watched
+        `interval`: Seconds between polls
+        `debounce`: Seconds without changes before the collected changes are applied
+
+    Example:
+        >>> reloader = HotReloader(bot)
+        >>> reloader.start()
+    """
+
+    def __init__(
+        self,
+        bot: "ModularBot",
+        roots: tuple[str, ...] = ("extensions", "plugins"),
+        interval: float = 1.0,
+        debounce: float = 0.5,
+    ) -> None:
+        self.logger = logging.getLogger("hot-reload")
+        self.bot = bot
+        self.roots = roots
+        self.interval = interval
+        self.debounce = debounce
+
+        self._mtimes: dict[str, int] = {}
+        self._synced: dict[str, Optional[int]] = {}
+        self._changed: set[str] = set()
+        self._last_change: float = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def mark_synced(self, paths: list[str]) -> None:
+        "Ignores the current state of files the bot itself wrote or removed"
+
+        for path in map(os.path.normpath, paths):
+            try:
+                mtime: Optional[int] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+
+            self._synced[path] = mtime
+            self._changed.discard(path)
+            if mtime is None:
+                self._mtimes.pop(path, None)
+            else:
+                self._mtimes[path] = mtime
+
+    async def _watch(self) -> None:
+        # Plugins are downloaded and loaded by the startup, not by the reloader
+        await self.bot.startup.wait()
+
+        loop = asyncio.get_running_loop()
+        self._mtimes = await loop.run_in_executor(None, scan_sources, self.roots)
+
+        while True:
+            await asyncio.sleep(min(self.interval, self.debounce))
+
+            mtimes = await loop.run_in_executor(None, scan_sources, self.roots)
+            changed = {
+                path
+                for path in mtimes.keys() | self._mtimes.keys()
+                if mtimes.get(path) != self._mtimes.get(path)
+            }
+            self._mtimes = mtimes
+
+            # A sync may finish while a scan is running, its files are still ignored
+            for path in list(changed):
+                if path in self._synced:
+                    if mtimes.get(path) == self._synced[path]:
+                        changed.discard(path)
+                    else:
+                        del self._synced[path]
+
+            if changed:
+                self._changed |= changed
+                self._last_change = time.monotonic()
+            elif (
+                self._changed and time.monotonic() - self._last_change >= self.debounce
+            ):
+                changed, self._changed = self._changed, set()
+                self.apply(changed)
+
+    def _plugin_for(self, path: str) -> Optional[tuple["Plugin", str]]:
+        "Plugin the file belongs to and the file relative to the plugin folder"
+
+        parts = os.path.relpath(path, "plugins").split(os.sep, 1)
+        if len(parts) != 2:
+            return None
+
+        for plugin in self.bot.plugins:
+            if plugin.folder_name == parts[0]:
+                return plugin, parts[1].replace(os.sep, "/")
+        return None
+
+    def apply(self, paths: set[str]) -> None:
+        "Reloads, loads or unloads the modules of the changed files"
+
+        refreshed: set[int] = set()
+        for path in sorted(paths):
+            exists = os.path.exists(path)
+
+            if os.path.relpath(path, "extensions").startswith(".."):
+                found = self._plugin_for(path)
+                if found is None:
+                    continue
+
+                plugin, file = found
+                handler = self.bot.plugin_handler
+                if handler.lazy.pending(plugin.id):
+                    if plugin.id not in refreshed:
+                        handler.lazy.refresh(plugin)
+                    refreshed.add(plugin.id)
+                    continue
+                if handler.isolated.handles(plugin.id):
+                    if plugin.id not in refreshed:
+                        handler.isolated.refresh(plugin)
+                    refreshed.add(plugin.id)
+                    continue
+
+                # Files of disabled plugins and new files of plugins are left alone
+                module = plugin.generate_safe_path(file)
+                if module not in self.bot.extensions:
+                    continue
+            else:
+                relative = os.path.relpath(path, "extensions")
+                if os.sep in relative:
+                    continue  # Only top level files are extensions
+                module = "extensions." + relative[: -len(".py")]
+
+            self._apply_module(module, exists)
+
+    def _apply_module(self, module: str, exists: bool) -> None:
+        try:
+            if module in self.bot.extensions and exists:
+                self.bot.reload_extension(module)
+                action = "Reloaded"
+            elif module in self.bot.extensions:
+                self.bot.unload_extension(module)
+                action = "Unloaded"
+            elif exists:
+                self.bot.load_extension(module)
+                action = "Loaded"
+            else:
+                return
+        except ExtensionError as e:
+            self.logger.error(
+                termcolor.colored(f"Could not hot reload {module}: {e}", "red")
+            )
+            return
+
+        self.logger.info(termcolor.colored(f"{action} {module}", "green"))
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+from importlib import metadata
+from typing import Iterable
+
+from packaging.requirements import InvalidRequirement, Requirement
+
+logger = logging.getLogger("requirements")
+
+
+def parse_requirements(lines: Iterable[str]) -> tuple[list[Requirement], list[str]]:
+    """Parses requirements.txt lines, skips comments
+
+    Returns the requirements and the lines that are not plain requirements (pip options
+    like `-r` or `-e`, URLs, VCS links), only pip itself can resolve those.
+    """
+
+    requirements: list[Requirement] = []
+    unparsed: list[str] = []
+    for line in lines:
+        line = line.split(" #", 1)[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("-"):
+            unparsed.append(line)
+            continue
+
+        try:
+            requirements.append(Requirement(line))
+        except InvalidRequirement:
+            unparsed.append(line)
+
+    return requirements, unparsed
+
+
+def is_satisfied(requirement: Requirement) -> bool:
+    "Checks installed distribution metadata, nothing gets imported"
+
+    if requirement.marker is not None and not requirement.marker.evaluate():
+        return True  # Not needed on this platform
+
+    try:
+        version = metadata.version(requirement.name)
+    except metadata.PackageNotFoundError:
+        return False
+
+    return requirement.specifier.contains(version, prereleases=True)
+
+
+def missing_requirements(requirements: Iterable[Requirement]) -> list[str]:
+    "Unique requirement strings that are not installed in a matching version"
+
+    return list(dict.fromkeys(str(i) for i in requirements if not is_satisfied(i)))
+
+
+def hash_requirements(content: bytes) -> str:
+    "Cache key of a requirements file, bound to the interpreter it was resolved for"
+
+    digest = hashlib.sha256(content)
+    digest.update(sys.prefix.encode())
+    digest.update(sys.version.encode())
+    return digest.hexdigest()
+
+
+class RequirementsCache:
+    """Hashes of requirements files that were fully satisfied, stored as JSON
+
+    Example:
+        >>> cache = RequirementsCache("plugins/.requirements-cache.json")
+        >>> if not cache.satisfied(key):
+        >>>     ...
+        >>> cache.add(key)
+        >>> cache.save()
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        try:
+            with open(path, "r") as f:
+                self._hashes: set[str] = set(json.load(f))
+        except (OSError, ValueError):
+            self._hashes = set()
+
+    def satisfied(self, key: str) -> bool:
+        return key in self._hashes
+
+    def add(self, key: str) -> None:
+        self._hashes.add(key)
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(sorted(self._hashes), f)
@@ -0,0 +1,243 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Optional, Union
+
+from models.tasks import RepeatedTask, ScheduledTask
+
+Task = Union[ScheduledTask, RepeatedTask]
+TaskKey = tuple[str, int]
+
+
+def task_key(task: Task) -> TaskKey:
+    "Identifies a task across both tables"
+
+    return type(task).__name__, task.id
+
+
+CATCH_UP_POLICIES = ("once", "skip", "all")
+
+
+class CatchUpLimiter:
+    """Spaces out the runs of repeated tasks catching up on all missed repetitions
+
+    All catching up tasks share `rate` runs a second. A task runs once per repetition
+    it missed, so it only gets closer to the present while the tasks catching up
+    together repeat less often than `rate` in total. Tasks that would push the total
+    over it are not admitted, and a task whose lag stopped shrinking is released, both
+    fall back to the `once` policy.
+
+    Attributes:
+        `rate`: Catch-up runs a second across all tasks
+        `demand`: Repetitions a second of the admitted tasks
+
+    Example:
+        >>> limiter = CatchUpLimiter(rate=1.0)
+        >>> if limiter.admit(task, now):
+        >>>     scheduler.push(task, limiter.slot(now))
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.demand = 0.0
+
+        self._next_slot = 0.0
+        self._lags: dict[int, tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._lags)
+
+    def __contains__(self, task_id: int) -> bool:
+        return task_id in self._lags
+
+    def admit(self, task: RepeatedTask, now: float) -> bool:
+        "Whether the task may keep catching up on all missed repetitions"
+
+        lag = now - task.execute_on
+        entry = self._lags.get(task.id)
+        if entry is not None:
+            if lag < entry[1]:
+                self._lags[task.id] = (entry[0], lag)
+                return True
+            self.release(task.id)
+            return False
+
+        demand = 1 / task.repeat_time
+        if self.demand + demand >= self.rate:
+            return False
+
+        self._lags[task.id] = (demand, lag)
+        self.demand += demand
+        return True
+
+    def release(self, task_id: int) -> None:
+        entry = self._lags.pop(task_id, None)
+        if entry is not None:
+            self.demand = self.demand - entry[0] if self._lags else 0.0
+
+    def slot(self, now: float) -> float:
+        "Time of the next catch-up run"
+
+        self._next_slot = max(now, self._next_slot) + 1 / self.rate
+        return self._next_slot
+
+
+def catch_up(
+    task: RepeatedTask, now: float, limiter: Optional[CatchUpLimiter] = None
+) -> tuple[bool, int]:
+    """Whether a due repeated task should run now and by how many repetitions to move it
+
+    Repetitions missed while the bot was down are counted from `repeat_time` directly:
+    - `once`: Run once, continue with the next repetition in the future
+    - `skip`: Don't run the missed repetitions, continue with the next one in the future
+    - `all`: Run every missed repetition, one per run, while the `limiter` admits the
+      task, `once` otherwise
+
+    Raises ValueError for unknown policies.
+    """
+
+    if task.catch_up not in CATCH_UP_POLICIES:
+        raise ValueError(f"Unknown catch-up policy {task.catch_up!r}")
+    if task.repeat_time <= 0:
+        return True, 1
+
+    # Later repetitions that are already due too
+    missed = max(int((now - task.execute_on) // task.repeat_time), 0)
+    if missed == 0:
+        if limiter is not None:
+            limiter.release(task.id)
+        return True, 1
+    if task.catch_up == "all" and (limiter is None or limiter.admit(task, now)):
+        return True, 1
+    if task.catch_up == "skip":
+        return False, missed + 1
+    return True, missed + 1
+
+
+class TaskScheduler:
+    """Runs tasks at their `execute_on` time
+
+    Pending tasks are kept in a min-heap ordered by deadline, the scheduler sleeps until
+    the earliest deadline and is woken up early only when a task with an earlier deadline
+    is pushed. Pushing is O(log n), cancelling is O(1): cancelled entries stay in the heap
+    and are skipped when they surface, the heap is rebuilt once they make up most of it.
+
+    Tasks that are due at the same time are handed to `execute` together in one batch,
+    every batch runs in its own asyncio task so a slow batch does not delay the next ones.
+
+    Attributes:
+        `execute`: Coroutine function that runs a batch of due tasks
+
+    Example:
+        >>> scheduler = TaskScheduler(execute)
+        >>> scheduler.push(task)
+        >>> scheduler.start()
+    """
+
+    def __init__(self, execute: Callable[[list[Task]], Awaitable[None]]) -> None:
+        self.logger = logging.getLogger("scheduler")
+        self.execute = execute
+
+        self._heap: list[tuple[float, int, TaskKey]] = []
+        self._pending: dict[TaskKey, tuple[int, Task, float]] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._running: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, key: TaskKey) -> bool:
+        return key in self._pending
+
+    def push(self, task: Task, deadline: Optional[float] = None) -> None:
+        """Adds the task or moves it to its new deadline if it is already pending
+
+        The deadline defaults to `task.execute_on`.
+        """
+
+        key = task_key(task)
+        sequence = next(self._counter)
+        deadline = task.execute_on if deadline is None else deadline
+        self._pending[key] = (sequence, task, deadline)
+        heapq.heappush(self._heap, (deadline, sequence, key))
+
+        if self._heap[0][1] == sequence:
+            self._wakeup.set()  # New earliest deadline
+        self._compact()
+
+    def cancel(self, key: TaskKey) -> bool:
+        "Removes the pending task, returns False if it was not pending"
+
+        if self._pending.pop(key, None) is None:
+            return False
+
+        self._compact()
+        return True
+
+    def next_deadline(self) -> Optional[float]:
+        while self._heap:
+            deadline, sequence, key = self._heap[0]
+            entry = self._pending.get(key)
+            if entry is not None and entry[0] == sequence:
+                return deadline
+            heapq.heappop(self._heap)  # Cancelled or moved
+
+        return None
+
+    def pop_due(self, now: float) -> list[Task]:
+        due: list[Task] = []
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                return due
+
+            _, _, key = heapq.heappop(self._heap)
+            due.append(self._pending.pop(key)[1])
+
+    def _compact(self) -> None:
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = [
+                (deadline, sequence, key)
+                for key, (sequence, _, deadline) in self._pending.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def start(self) -> None:
+        if self._runner is None:
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+
+    async def _run(self) -> None:
+        while True:
+            now = time.time()
+            deadline = self.next_deadline()
+
+            if deadline is None or deadline > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(),
+                        None if deadline is None else deadline - now,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due = self.pop_due(now)
+            running = asyncio.get_running_loop().create_task(self._execute(due))
+            self._running.add(running)
+            running.add_done_callback(self._running.discard)
+
+    async def _execute(self, tasks: list[Task]) -> None:
+        try:
+            await self.execute(tasks)
+        except Exception as e:
+            self.logger.exception(f"Batch of {len(tasks)} tasks failed: {e}")
@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+from typing import NamedTuple, Optional
+
+from models.plugins import PluginData, PluginFiles
+
+
+class PluginEntry(NamedTuple):
+    data: PluginData
+    files: list[PluginFiles]
+    dependencies: list[int]
+
+
+def serialize_entry(entry: PluginEntry) -> dict:
+    return {
+        "data": entry.data.dict(),
+        "files": sorted((i.dict() for i in entry.files), key=lambda i: i["id"]),
+        "dependencies": sorted(entry.dependencies),
+    }
+
+
+def load_state(entry: PluginEntry) -> tuple:
+    "Everything that decides whether and how the plugin is loaded"
+
+    data = entry.data
+    return data.enabled, data.lazy, data.isolated, sorted(entry.dependencies)
+
+
+def deserialize_entry(raw: dict) -> PluginEntry:
+    return PluginEntry(
+        data=PluginData(**raw["data"]),
+        files=[PluginFiles(**i) for i in raw["files"]],
+        dependencies=raw["dependencies"],
+    )
+
+
+def stat_file(path: str) -> Optional[list[int]]:
+    "Size and modification time of the file, None if it does not exist"
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class PluginSnapshot:
+    """Plugin rows and the state of their files at the end of the last full sync
+
+    While all plugin files still have the size and modification time recorded in the
+    snapshot, the plugins can be created from it without asking the database and
+    without hashing the files. The snapshot should be revalidated against the database
+    in the background.
+
+    Attributes:
+        `path`: JSON file the snapshot is stored in
+
+    Example:
+        >>> snapshot = PluginSnapshot("plugins/.snapshot.json")
+        >>> entries = snapshot.load()
+        >>> if entries is None:
+        >>>     entries = await fetch_from_database()
+        >>>     snapshot.save(entries)
+    """
+
+    def __init__(self, path: str) -> None:
+        self.logger = logging.getLogger("plugin-snapshot")
+        self.path = path
+
+    def load(self) -> Optional[list[PluginEntry]]:
+        "Entries of the snapshot, None if there is none or some plugin file changed"
+
+        try:
+            with open(self.path, "r") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            for path, recorded in raw["stat"].items():
+                if recorded is None or stat_file(path) != recorded:
+                    self.logger.info(f"{path} changed since the last sync")
+                    return None
+
+            return [deserialize_entry(i) for i in raw["plugins"]]
+
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning(f"Ignoring malformed plugin snapshot: {e}")
+            return None
+
+    def save(self, entries: list[PluginEntry]) -> None:
+        stat: dict[str, Optional[list[int]]] = {}
+        for entry in entries:
+            for file in entry.files:
+                path = f"plugins/{entry.data.folder_name}/{file.file}"
+                stat[path] = stat_file(path)
+
+        # Written next to the target and moved in place, a crash never leaves half a file
+        partial = self.path + ".part"
+        with open(partial, "w") as f:
+            json.dump(
+                {"plugins": [serialize_entry(i) for i in entries], "stat": stat}, f
+            )
+        os.replace(partial, self.path)
+
+    def invalidate(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
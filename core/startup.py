@@ -0,0 +1,84 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional, Union
+
+if TYPE_CHECKING:
+    from main import ModularBot
+
+Stage = Callable[[], Union[Awaitable[Any], Any]]
+
+
+class StartupPipeline:
+    """Startup work that runs in the background while the bot connects to the gateway
+
+    Stages run in the order they were added, a failing stage is logged and the next
+    one still runs. Blocking stages should hand their work to an executor.
+
+    Attributes:
+        `bot`: The bot instance
+        `timings`: Seconds spent in every finished stage
+        `errors`: Exceptions of failed stages
+        `current`: Name of the running stage, None before start and after the end
+
+    Example:
+        >>> bot.startup.add_stage("config", bot.setup_config)
+        >>> bot.startup.start()
+        >>> await bot.startup.wait()
+    """
+
+    def __init__(self, bot: "ModularBot") -> None:
+        self.logger = logging.getLogger("startup")
+        self.bot = bot
+
+        self.stages: list[tuple[str, Stage]] = []
+        self.timings: dict[str, float] = {}
+        self.errors: dict[str, BaseException] = {}
+        self.current: Optional[str] = None
+
+        self._task: Optional[asyncio.Task] = None
+        self._finished = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    @property
+    def total(self) -> float:
+        return sum(self.timings.values())
+
+    def add_stage(self, name: str, stage: Stage) -> None:
+        self.stages.append((name, stage))
+
+    def start(self) -> None:
+        "Schedules the pipeline on the running loop, does nothing if it already started"
+
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def wait(self) -> None:
+        await self._finished.wait()
+
+    async def run(self) -> None:
+        for name, stage in self.stages:
+            self.current = name
+            self.logger.info(f"Startup stage `{name}` started")
+            start = time.perf_counter()
+
+            try:
+                result = stage()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                self.errors[name] = e
+                self.logger.exception(f"Startup stage `{name}` failed: {e}")
+
+            self.timings[name] = time.perf_counter() - start
+            self.logger.info(
+                f"Startup stage `{name}` finished in {self.timings[name] * 1000:.1f} ms"
+            )
+
+        self.current = None
+        self._finished.set()
+        self.logger.info(f"Startup finished in {self.total * 1000:.1f} ms")
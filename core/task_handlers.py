@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from core.scheduler import Task, TaskKey, task_key
+
+Handler = Callable[[Task, Any], Awaitable[None]]
+Deserializer = Callable[[str], Any]
+
+
+class TaskHandler:
+    """Handler of one task type
+
+    Attributes:
+        `type`: The task type
+        `function`: Coroutine function called with the task and its deserialized data
+        `semaphore`: Limits how many tasks of the type run at once
+        `timeout`: Seconds a task may run before it is cancelled, None for no limit
+        `deserialize`: Turns `task.data` into the object passed to the function
+    """
+
+    def __init__(
+        self,
+        type: str,
+        function: Handler,
+        concurrency: int,
+        timeout: Optional[float],
+        deserialize: Deserializer,
+    ) -> None:
+        self.type = type
+        self.function = function
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = timeout
+        self.deserialize = deserialize
+
+    @property
+    def module(self) -> str:
+        return getattr(self.function, "__module__", "") or ""
+
+    async def run(self, task: Task, data: Any) -> None:
+        await asyncio.wait_for(self.function(task, data), self.timeout)
+
+
+class TaskHandlerRegistry:
+    """Handlers of task types, filled by extensions and plugins in their `setup`
+
+    Every type has its own concurrency limit and timeout, so a slow type can't occupy
+    everything. The deserialized `data` of a task is cached, repeated tasks are parsed
+    only once. Handlers of a plugin are removed when the plugin is unloaded.
+
+    Attributes:
+        `handlers`: Handler of every registered type
+
+    Example:
+        >>> async def remind(task: ScheduledTask, data: dict) -> None:
+        >>>     ...
+        >>> bot.task_handlers.register("reminder", remind, concurrency=8, timeout=10)
+    """
+
+    def __init__(self, cache_size: int = 10_000) -> None:
+        self.logger = logging.getLogger("task-handlers")
+        self.handlers: dict[str, TaskHandler] = {}
+        self.cache_size = cache_size
+
+        self._data: OrderedDict[TaskKey, tuple[str, Any]] = OrderedDict()
+
+    def register(
+        self,
+        type: str,
+        function: Handler,
+        *,
+        concurrency: int = 4,
+        timeout: Optional[float] = 60,
+        deserialize: Deserializer = json.loads,
+    ) -> None:
+        "Registers the handler, a module may replace its own handler when it is reloaded"
+
+        handler = TaskHandler(type, function, concurrency, timeout, deserialize)
+        current = self.handlers.get(type)
+        if current is not None and current.module != handler.module:
+            raise ValueError(f"Task type {type} is already handled by {current.module}")
+
+        self.handlers[type] = handler
+        self.logger.debug(f"Task type {type} handled by {handler.module}")
+
+    def unregister(self, type: str) -> None:
+        self.handlers.pop(type, None)
+
+    def unregister_module(self, prefix: str) -> None:
+        "Removes handlers defined in modules starting with the prefix"
+
+        for type in [
+            i.type for i in self.handlers.values() if i.module.startswith(prefix)
+        ]:
+            self.unregister(type)
+
+    def get(self, type: str) -> Optional[TaskHandler]:
+        return self.handlers.get(type)
+
+    def data(self, task: Task, handler: TaskHandler) -> Any:
+        "Deserialized task data, cached until the data of the task changes"
+
+        key = task_key(task)
+        cached = self._data.get(key)
+        if cached is not None and cached[0] == task.data:
+            self._data.move_to_end(key)
+            return cached[1]
+
+        value = handler.deserialize(task.data)
+        self._data[key] = (task.data, value)
+        if len(self._data) > self.cache_size:
+            self._data.popitem(last=False)
+        return value
+
+    def forget(self, task: Task) -> None:
+        "Drops the cached data of a finished task"
+
+        self._data.pop(task_key(task), None)
@@ -0,0 +1,163 @@
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+import termcolor
+
+if TYPE_CHECKING:
+    from main import ModularBot
+
+    from core.plugin import Plugin
+
+
+class Incident(NamedTuple):
+    plugin: Optional[str]
+    lag: float
+    stack: str
+    time: float
+
+
+class LoopWatchdog:
+    """Watches the event loop from a thread and finds plugins that block it
+
+    The thread schedules a probe on the loop every `interval` seconds. If the probe does
+    not run within `threshold` seconds, the stack of the loop thread is captured and the
+    innermost frame from `plugins/<folder_name>` names the offending plugin. Plugins
+    blocking the loop `strikes` times within `window` seconds are disabled and unloaded.
+
+    Attributes:
+        `bot`: The bot instance
+        `threshold`: Loop lag in seconds that counts as blocking
+        `interval`: Seconds between probes
+        `strikes`: Incidents after which a plugin is disabled, None to never disable
+        `window`: Seconds an incident counts towards the strikes
+        `lag`: Lag of the last probe in seconds
+        `incidents`: Recent incidents, newest last
+
+    Example:
+        >>> watchdog = LoopWatchdog(bot, threshold=0.5, strikes=3)
+        >>> watchdog.start()
+    """
+
+    def __init__(
+        self,
+        bot: "ModularBot",
+        threshold: float = 1.0,
+        interval: float = 0.5,
+        strikes: Optional[int] = None,
+        window: float = 600,
+        history: int = 50,
+    ) -> None:
+        self.logger = logging.getLogger("watchdog")
+        self.bot = bot
+        self.threshold = threshold
+        self.interval = interval
+        self.strikes = strikes
+        self.window = window
+
+        self.lag: float = 0.0
+        self.incidents: collections.deque[Incident] = collections.deque(maxlen=history)
+
+        self._strikes: dict[int, collections.deque[float]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        "Starts watching the running loop, must be called from the loop thread"
+
+        if self._thread is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _watch(self) -> None:
+        assert self._loop is not None
+
+        while not self._stop.wait(self.interval):
+            probe = threading.Event()
+            sent = time.perf_counter()
+            try:
+                self._loop.call_soon_threadsafe(probe.set)
+            except RuntimeError:
+                return  # Loop closed
+
+            if probe.wait(self.threshold):
+                self.lag = time.perf_counter() - sent
+                continue
+
+            # Blocked, the stack is taken while the offending code still runs
+            frame = sys._current_frames().get(self._loop_thread)  # type: ignore
+            plugin, stack = self._blame(frame)
+
+            probe.wait()
+            self.lag = time.perf_counter() - sent
+            incident = Incident(
+                plugin.name if plugin else None, self.lag, stack, time.time()
+            )
+
+            try:
+                self._loop.call_soon_threadsafe(self._report, incident, plugin)
+            except RuntimeError:
+                return
+
+    def _blame(self, frame: Optional[FrameType]) -> tuple[Optional["Plugin"], str]:
+        "Innermost plugin on the stack and the formatted stack"
+
+        if frame is None:
+            return None, ""
+
+        profiler = self.bot.plugin_handler.profiler
+        plugin = None
+        current: Optional[FrameType] = frame
+        while current is not None and plugin is None:
+            plugin = profiler.plugin_for_path(current.f_code.co_filename)
+            current = current.f_back
+
+        return plugin, "".join(traceback.format_stack(frame))
+
+    def _report(self, incident: Incident, plugin: Optional["Plugin"]) -> None:
+        self.incidents.append(incident)
+        self.logger.warning(
+            termcolor.colored(
+                f"Event loop blocked for {incident.lag * 1000:.0f} ms by "
+                f"{incident.plugin or 'unknown code'}",
+                "yellow",
+            )
+        )
+        self.logger.debug(f"Blocking stack:\n{incident.stack}")
+
+        if plugin is None or self.strikes is None:
+            return
+
+        strikes = self._strikes.setdefault(plugin.id, collections.deque())
+        strikes.append(incident.time)
+        while strikes and strikes[0] < incident.time - self.window:
+            strikes.popleft()
+
+        if len(strikes) >= self.strikes and plugin.enabled:
+            strikes.clear()
+            self.logger.error(
+                termcolor.colored(
+                    f"Plugin {plugin.name} blocked the event loop {self.strikes} times, disabling it",
+                    "red",
+                )
+            )
+            self.bot.plugin_handler.lazy.forget(plugin.id)
+            plugin.unload()
+            asyncio.get_running_loop().create_task(plugin.disable())
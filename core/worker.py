@@ -0,0 +1,341 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+import discord
+from discord.ext import commands
+from discord.ext.commands.context import Context
+from discord.ext.commands.view import StringView
+from models.config import Config
+
+from core.manifest import CommandInfo
+from core.plugin import Plugin
+from core.task_handlers import TaskHandlerRegistry
+
+if TYPE_CHECKING:
+    from main import ModularBot
+
+
+class CommandRequest(NamedTuple):
+    "Everything a worker gets to know about an invocation, plain data only"
+
+    command: str
+    arguments: str
+    prefix: str
+    invoked_with: str
+    content: str
+    message_id: int
+    author_id: int
+    author_name: str
+    author_display_name: str
+    channel_id: int
+    guild_id: Optional[int]
+
+
+class Reply(NamedTuple):
+    content: Optional[str]
+    embed: Optional[dict]
+    files: list[tuple[str, bytes]]
+
+
+class CommandResponse(NamedTuple):
+    replies: list[Reply]
+    error: Optional[str] = None
+
+
+class WorkerBot(commands.Bot):
+    """Bot of a worker process, never connects
+
+    Has the attributes of ModularBot that plugins use in `setup` and commands, backed
+    by a copy of the config. Task handlers registered here are never called and the
+    database is not available.
+    """
+
+    def __init__(self, config: dict) -> None:
+        super().__init__(command_prefix="", help_command=None)
+        self.config = Config(**config)
+        self.task_handlers = TaskHandlerRegistry()
+        self.plugins: list[Plugin] = []
+
+    def session(self):
+        raise RuntimeError("Isolated plugins have no database access")
+
+
+# State of the worker process
+_bot: Optional[WorkerBot] = None
+_load_errors: dict[str, str] = {}
+
+
+class WorkerContext(Context):
+    "Context whose messages are collected and sent by the bot process"
+
+    def __init__(self, **attrs) -> None:
+        super().__init__(**attrs)
+        self.replies: list[Reply] = []
+
+    async def send(
+        self, content=None, *, embed=None, file=None, files=None, **kwargs
+    ) -> None:
+        files = ([file] if file is not None else []) + list(files or [])
+        self.replies.append(
+            Reply(
+                content=str(content) if content is not None else None,
+                embed=embed.to_dict() if embed is not None else None,
+                files=[(i.filename, i.fp.read()) for i in files],
+            )
+        )
+
+    async def reply(self, content=None, **kwargs) -> None:
+        await self.send(content, **kwargs)
+
+    async def trigger_typing(self) -> None:
+        pass
+
+
+def initialize_worker(extensions: list[str], config: dict) -> None:
+    "Runs once in every worker process, loads the plugin files into a bot that never connects"
+
+    global _bot
+
+    logging.basicConfig(level=logging.INFO)
+    _bot = WorkerBot(config)
+    for extension in extensions:
+        # A failing initializer breaks the pool, it would be restarted on every command
+        try:
+            _bot.load_extension(extension)
+        except Exception as e:
+            _load_errors[extension] = f"{type(e).__name__}: {e}"
+            logging.exception(f"Could not load {extension} in the worker")
+
+
+def run_command(request: CommandRequest) -> CommandResponse:
+    "Runs in the worker process"
+
+    assert _bot is not None
+    return _bot.loop.run_until_complete(_invoke(_bot, request))
+
+
+async def _invoke(bot: WorkerBot, request: CommandRequest) -> CommandResponse:
+    command = bot.get_command(request.command)
+    if command is None and _load_errors:
+        return CommandResponse(
+            [],
+            f"Plugin failed to load in the worker: {'; '.join(_load_errors.values())}",
+        )
+    if command is None:
+        return CommandResponse([], f"Command {request.command} not found in the worker")
+
+    author = SimpleNamespace(
+        id=request.author_id,
+        name=request.author_name,
+        display_name=request.author_display_name,
+        mention=f"<@{request.author_id}>",
+        bot=False,
+    )
+    message = SimpleNamespace(
+        id=request.message_id,
+        content=request.content,
+        author=author,
+        channel=SimpleNamespace(id=request.channel_id),
+        guild=SimpleNamespace(id=request.guild_id) if request.guild_id else None,
+    )
+
+    ctx = WorkerContext(
+        message=message,
+        bot=bot,
+        view=StringView(request.arguments),
+        prefix=request.prefix,
+        invoked_with=request.invoked_with,
+        command=command,
+    )
+
+    try:
+        await command.invoke(ctx)
+    except Exception as e:
+        return CommandResponse(ctx.replies, f"{type(e).__name__}: {e}")
+
+    return CommandResponse(ctx.replies)
+
+
+class PluginWorker:
+    """Process running the commands of one isolated plugin
+
+    Attributes:
+        `plugin`: The plugin
+        `timeout`: Seconds a command may run before the worker is restarted
+    """
+
+    def __init__(self, plugin: Plugin, timeout: float = 60) -> None:
+        self.logger = logging.getLogger("worker." + plugin.name)
+        self.plugin = plugin
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        # Forking a process with a running event loop and threads is not safe
+        self._executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initialize_worker,
+            initargs=(
+                [
+                    self.plugin.generate_safe_path(i)
+                    for i in self.plugin.extension_files
+                ],
+                self.plugin.bot.config.dict(),
+            ),
+        )
+        # Spawns the process right away, the first command doesn't wait for the imports
+        self._executor.submit(int)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def restart(self) -> None:
+        self.shutdown()
+        self.start()
+
+    async def call(self, request: CommandRequest) -> CommandResponse:
+        if self._executor is None:
+            self.start()
+        assert self._executor is not None
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, run_command, request),
+                self.timeout,
+            )
+        except asyncio.TimeoutError:
+            self.logger.error(f"{request.command} timed out, restarting the worker")
+            self._kill()
+            return CommandResponse([], "Command timed out")
+        except BrokenProcessPool:
+            self.logger.error("Worker process died, restarting it")
+            self.restart()
+            return CommandResponse([], "Worker process died")
+
+    def _kill(self) -> None:
+        if self._executor is not None:
+            for process in list(getattr(self._executor, "_processes", {}).values()):
+                process.kill()
+        self.restart()
+
+
+class IsolatedPlugins:
+    """Runs commands of isolated plugins in worker processes
+
+    The bot process registers a stub for every command found in the plugin files. A stub
+    turns the invocation into a `CommandRequest`, the worker runs the real command and
+    returns what it sent, the stub then sends it. Arguments are converted in the worker,
+    which has no gateway cache, so commands should take plain text arguments.
+
+    Attributes:
+        `bot`: The bot instance
+        `workers`: Worker of every isolated plugin
+
+    Example:
+        >>> isolated = IsolatedPlugins(bot)
+        >>> isolated.register(plugin, plugin.manifest())
+    """
+
+    def __init__(self, bot: "ModularBot") -> None:
+        self.logger = logging.getLogger("isolated-plugins")
+        self.bot = bot
+        self.workers: dict[int, PluginWorker] = {}
+        self._stubs: dict[int, list[str]] = {}
+
+    def handles(self, plugin_id: int) -> bool:
+        return plugin_id in self.workers
+
+    def register(self, plugin: Plugin, manifest: list[CommandInfo]) -> None:
+        self.workers[plugin.id] = PluginWorker(plugin)
+        self.workers[plugin.id].start()
+        self._add_stubs(plugin, manifest)
+
+    def refresh(self, plugin: Plugin) -> None:
+        "Restarts the worker and rebuilds the stubs after the plugin files changed"
+
+        self._remove_stubs(plugin.id)
+        self.workers[plugin.id].restart()
+        self._add_stubs(plugin, plugin.manifest())
+
+    def forget(self, plugin_id: int) -> None:
+        self._remove_stubs(plugin_id)
+        worker = self.workers.pop(plugin_id, None)
+        if worker is not None:
+            worker.shutdown()
+
+    def shutdown(self) -> None:
+        for worker in self.workers.values():
+            worker.shutdown()
+
+    def _add_stubs(self, plugin: Plugin, manifest: list[CommandInfo]) -> None:
+        names: list[str] = []
+        for info in manifest:
+            if self.bot.get_command(info.name) is not None:
+                self.logger.warning(
+                    f"Command {info.name} of {plugin.name} is already registered, no stub"
+                )
+                continue
+
+            self.bot.add_command(
+                commands.Command(
+                    self._stub(plugin.id, info.name),
+                    name=info.name,
+                    aliases=[
+                        i for i in info.aliases if self.bot.get_command(i) is None
+                    ],
+                    help=info.help,
+                )
+            )
+            names.append(info.name)
+
+        self._stubs[plugin.id] = names
+
+    def _remove_stubs(self, plugin_id: int) -> None:
+        for name in self._stubs.pop(plugin_id, []):
+            self.bot.remove_command(name)
+
+    def _stub(self, plugin_id: int, name: str):
+        async def stub(ctx: Context, *, arguments: str = "") -> None:
+            request = CommandRequest(
+                command=name,
+                arguments=arguments,
+                prefix=ctx.prefix,
+                invoked_with=ctx.invoked_with,
+                content=ctx.message.content,
+                message_id=ctx.message.id,
+                author_id=ctx.author.id,
+                author_name=ctx.author.name,
+                author_display_name=ctx.author.display_name,
+                channel_id=ctx.channel.id,
+                guild_id=ctx.guild.id if ctx.guild else None,
+            )
+
+            async with ctx.typing():
+                response = await self.workers[plugin_id].call(request)
+
+            for reply in response.replies:
+                await ctx.send(
+                    reply.content,
+                    embed=discord.Embed.from_dict(reply.embed) if reply.embed else None,
+                    files=[
+                        discord.File(io.BytesIO(data), filename)
+                        for filename, data in reply.files
+                    ]
+                    or None,
+                )
+
+            if response.error is not None:
+                self.logger.error(f"{name} failed in the worker: {response.error}")
+                await ctx.send(f"❌ {response.error}")
+
+        return stub
@@ -1,17 +1,49 @@
 from configparser import ConfigParser
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-from sqlalchemy.future import Engine
-from sqlmodel import Session
-from sqlmodel import create_engine as _create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 config = ConfigParser()
 config.read("alembic.ini")
 
+# Blocking drivers used by alembic mapped to their asyncio counterparts
+async_drivers = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
 
-def generate_engine(verbose=False) -> Engine:
-    return _create_engine(config["alembic"]["sqlalchemy.url"], echo=verbose)
 
+def get_database_url() -> str:
+    "Returns the database url from alembic.ini rewritten to use an asyncio driver"
 
-def get_session(engine) -> Session:
-    with Session(engine) as session:
-        return session
+    url = make_url(config["alembic"]["sqlalchemy.url"])
+    return str(url.set(drivername=async_drivers.get(url.drivername, url.drivername)))
+
+
+def generate_engine(verbose=False) -> AsyncEngine:
+    return create_async_engine(get_database_url(), echo=verbose, future=True)
+
+
+def get_session_factory(engine: AsyncEngine) -> sessionmaker:
+    "Returns a factory of AsyncSession objects bound to the engine"
+
+    # Objects stay usable after commit, nothing gets lazily refreshed outside of an await
+    return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@asynccontextmanager
+async def session_scope(factory: sessionmaker) -> AsyncIterator[AsyncSession]:
+    "Opens a session for the current task, rolls back on error and always closes it"
+
+    session: AsyncSession = factory()
+    try:
+        yield session
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
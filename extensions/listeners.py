@@ -4,6 +4,7 @@ import logging
 from typing import TYPE_CHECKING
 
 import discord
+from core.guilds import reconcile_guilds
 from discord.activity import Activity
 from discord.enums import ActivityType
 from discord.ext import commands
@@ -33,11 +34,9 @@ class Listeners(commands.Cog):
     async def on_ready(self):
         logging.info(f"Guilds joined: {len(self.bot.guilds)}")
 
-        for guild in self.bot.guilds:
-            if self.bot.database.query(Guild).filter_by(id=guild.id).first() is None:
-                logging.info(f"Adding guild {guild.name} to database")
-                self.bot.database.add(Guild(id=guild.id))
-                self.bot.database.commit()
+        # The first READY is handled by the startup pipeline, this covers reconnects
+        if self.bot.startup.finished:
+            await reconcile_guilds(self.bot, prune=self.bot.prune_guilds)
 
         await self.bot.change_presence(
             activity=Activity(type=ActivityType.listening, name="commands")
@@ -49,10 +48,12 @@ class Listeners(commands.Cog):
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild):
-        if self.bot.database.query(Guild).filter_by(id=guild.id).first() is None:
-            logging.info(f"Adding guild {guild.name} to database")
-            self.bot.database.add(Guild(id=guild.id))
-            self.bot.database.commit()
+        async with self.bot.session() as session:
+            if await session.get(Guild, guild.id) is None:
+                logging.info(f"Adding guild {guild.name} to database")
+                session.add(Guild(id=guild.id))
+                await session.commit()
+                self.bot.prefix_cache.set(guild.id, self.bot.prefix_cache.default)
 
         await self.bot.change_presence(
             activity=Activity(
@@ -62,10 +63,14 @@ class Listeners(commands.Cog):
 
     @commands.Cog.listener()
     async def on_guild_remove(self, guild: discord.Guild):
-        if self.bot.database.query(Guild).filter_by(id=guild.id).first() is not None:
-            logging.info(f"Removing guild {guild.name} from database")
-            self.bot.database.query(Guild).filter_by(id=guild.id).delete()
-            self.bot.database.commit()
+        async with self.bot.session() as session:
+            server = await session.get(Guild, guild.id)
+            if server is not None:
+                logging.info(f"Removing guild {guild.name} from database")
+                await session.delete(server)
+                await session.commit()
+
+        self.bot.prefix_cache.remove(guild.id)
 
         await self.bot.change_presence(
             activity=Activity(
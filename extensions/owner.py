@@ -40,6 +40,48 @@ class Owner(commands.Cog):
         )
         sys.exit()
 
+    @commands.is_owner()
+    @commands.command(name="prefix-cache", help="Show prefix cache statistics", pass_context=True)  # type: ignore
+    async def prefix_cache(self, ctx: Context):
+        stats = self.bot.prefix_cache.stats()
+        embed = discord.Embed(
+            colour=0x00FF00,
+            description="\n".join(f"{key}: `{value}`" for key, value in stats.items()),
+        )
+        embed.set_author(
+            name="Prefix cache", icon_url=self.bot.user.avatar_url.__str__()
+        )
+        await ctx.send(embed=embed)
+
+    @commands.is_owner()
+    @commands.command(name="startup", help="Show how long startup stages took", pass_context=True)  # type: ignore
+    async def startup(self, ctx: Context):
+        startup = self.bot.startup
+        lines = [
+            f"{'❌' if name in startup.errors else '✅'} {name}: `{seconds * 1000:.1f} ms`"
+            for name, seconds in startup.timings.items()
+        ]
+        if startup.current is not None:
+            lines.append(f"⏳ {startup.current}")
+        lines.append(f"Total: `{startup.total * 1000:.1f} ms`")
+
+        embed = discord.Embed(colour=0x00FF00, description="\n".join(lines))
+        embed.set_author(name="Startup", icon_url=self.bot.user.avatar_url.__str__())
+        await ctx.send(embed=embed)
+
+    @commands.is_owner()
+    @commands.command(name="watchdog", help="Show recent event loop blocking", pass_context=True)  # type: ignore
+    async def watchdog(self, ctx: Context):
+        watchdog = self.bot.watchdog
+        lines = [f"Lag: `{watchdog.lag * 1000:.1f} ms`"] + [
+            f"<t:{int(i.time)}:R> {i.plugin or 'unknown'}: `{i.lag * 1000:.0f} ms`"
+            for i in reversed(watchdog.incidents)
+        ][:10]
+
+        embed = discord.Embed(colour=0x00FF00, description="\n".join(lines))
+        embed.set_author(name="Watchdog", icon_url=self.bot.user.avatar_url.__str__())
+        await ctx.send(embed=embed)
+
     @commands.is_owner()
     @commands.command(name="eval", help="Evaluate string", pass_context=True)  # type: ignore
     async def eval(self, ctx: Context, *, message: str):
@@ -1,7 +1,9 @@
+import asyncio
 from typing import TYPE_CHECKING
 
 from core.embed import ModularEmbed, ModularEmbedList
 from core.paginator import Paginator
+from core.profiler import KINDS, PluginUsage
 from discord.ext import commands
 from discord.ext.commands.context import Context
 
@@ -28,11 +30,72 @@ class Plugins(commands.Cog):
         else:
             modular_embed = ModularEmbedList(self.bot, ctx, title="Plugins")
             for plugin in self.bot.plugins:
+                load_time = self.bot.plugin_handler.load_report.get(plugin.name)
                 modular_embed.add_data(
                     f"{'🟩' if plugin.enabled else '🟥'} {plugin.name}"
+                    + (f" `{load_time * 1000:.1f} ms`" if load_time is not None else "")
+                    + (" 💤" if self.bot.plugin_handler.lazy.pending(plugin.id) else "")
+                    + (
+                        " ⚙️"
+                        if self.bot.plugin_handler.isolated.handles(plugin.id)
+                        else ""
+                    )
                 )
             await modular_embed.build().run()
 
+    @commands.command(name="plugin-profile")
+    @commands.is_owner()
+    async def plugin_profile(self, ctx: Context):
+        if not self.bot.plugins:
+            embed = ModularEmbed(self.bot, title="No plugins found")
+            embed.set_author(
+                name="Plugin profile", icon_url=self.bot.user.avatar_url.__str__()
+            )
+            await ctx.send(embed=embed)
+            return
+
+        profiler = self.bot.plugin_handler.profiler
+        await asyncio.get_running_loop().run_in_executor(None, profiler.measure_memory)
+
+        modular_embed = ModularEmbedList(self.bot, ctx, title="Plugin profile")
+        for plugin in sorted(
+            self.bot.plugins,
+            key=lambda i: sum(profiler.usage.get(i.id, PluginUsage()).time.values()),
+            reverse=True,
+        ):
+            usage = profiler.usage.get(plugin.id, PluginUsage())
+            modular_embed.add_data(
+                f"**{plugin.name}**\n"
+                + " | ".join(
+                    f"{kind}: `{usage.time[kind] * 1000:.1f} ms` / `{usage.calls[kind]}`"
+                    for kind in KINDS
+                )
+                + (
+                    f" | memory: `{usage.memory / 1024:.1f} KiB`"
+                    if profiler.trace_memory
+                    else ""
+                )
+            )
+        await modular_embed.build().run()
+
+    @commands.command(name="plugin-update")
+    @commands.is_owner()
+    async def plugin_update(self, ctx: Context, name: str):
+        plugin = next((i for i in self.bot.plugins if i.name == name), None)
+        if plugin is None:
+            embed = ModularEmbed(self.bot, description=f"Plugin `{name}` not found")
+        elif await plugin.update():
+            embed = ModularEmbed(
+                self.bot, description=f"✅ {plugin.name} is at version {plugin.version}"
+            )
+        else:
+            embed = ModularEmbed(
+                self.bot, description=f"❌ Could not fully update {plugin.name}"
+            )
+
+        embed.set_author(name="Plugins", icon_url=self.bot.user.avatar_url.__str__())
+        await ctx.send(embed=embed)
+
 
 def setup(bot):
     bot.add_cog(Plugins(bot))
@@ -28,17 +28,16 @@ class Settings(commands.Cog):
 
             # Change prefix in database
             if ctx.guild is not None:
-                if (
-                    self.bot.database.query(Guild).filter_by(id=ctx.guild.id).first()
-                    is not None
-                ):
-                    logging.info(
-                        f"Updating prefix for guild {ctx.guild.name} to `{prefix}`"
-                    )
-                    self.bot.database.query(Guild).filter_by(id=ctx.guild.id).update(
-                        {Guild.prefix: prefix}
-                    )
-                    self.bot.database.commit()
+                async with self.bot.session() as session:
+                    server = await session.get(Guild, ctx.guild.id)
+                    if server is not None:
+                        logging.info(
+                            f"Updating prefix for guild {ctx.guild.name} to `{prefix}`"
+                        )
+                        server.prefix = prefix
+                        session.add(server)
+                        await session.commit()
+                        self.bot.prefix_cache.set(ctx.guild.id, prefix)
 
     @commands.command(name="pause", help="Show the bot, whos da boss: shutdown", pass_context=True)  # type: ignore
     @commands.is_owner()
@@ -76,6 +75,16 @@ class Settings(commands.Cog):
             )
         )
 
+    @commands.command(name="refresh-config", help="Reload bot config from the database, use after editing it on the dashboard", pass_context=True)  # type: ignore
+    @commands.is_owner()
+    async def refresh_config(self, ctx: Context):
+        config = await self.bot.config_cache.refresh()
+
+        embed = discord.Embed(colour=0x00FF00, description="✅ Config refreshed")
+        embed.set_author(name="Config", icon_url=self.bot.user.avatar_url.__str__())  # type: ignore
+        await ctx.send(embed=embed)
+        logging.info(f"Config refreshed: {config}")
+
 
 def setup(bot):
     bot.add_cog(Settings(bot))
@@ -1,15 +1,360 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Optional, Type
+
+from core.scheduler import (
+    CATCH_UP_POLICIES,
+    CatchUpLimiter,
+    Task,
+    TaskKey,
+    TaskScheduler,
+    catch_up,
+    task_key,
+)
 from discord.ext import commands
-from discord.ext.commands.bot import AutoShardedBot
+from models.tasks import RepeatedTask, ScheduledTask
+from sqlalchemy import case
+from sqlmodel import delete, select, update
+
+if TYPE_CHECKING:
+    from main import ModularBot
+
+# Most rows touched by one completion statement
+WRITE_CHUNK = 1000
+
+# Seconds between attempts to write the completion of a batch
+RETRY_DELAY = 30
+
+# Seconds before a task of a type nobody handles is checked again
+UNHANDLED_DELAY = 60
 
 
 class Tasks(commands.Cog):
-    "Tasks"
+    """Executes scheduled and repeated tasks
+
+    A due task is run by the handler registered for its type in `bot.task_handlers`,
+    within the limits of the type and at most `max_concurrency` tasks at once. Tasks of
+    types without a handler are passed to the `on_<type>_task` listeners instead, tasks
+    nothing handles stay pending until a plugin handling them is loaded.
+    Tasks due at the same time are grouped by type and guild, the groups run
+    concurrently and the tasks of a group one after another in order, so a burst of
+    tasks in one guild holds one slot instead of all of them. Afterwards the finished
+    scheduled tasks are deleted and the repeated tasks moved by `repeat_time`, with one
+    statement each per batch.
 
-    def __init__(self, bot: AutoShardedBot):
+    Repetitions of a repeated task missed during downtime are handled by the catch-up
+    policy of the task, with the `all` policy they run at most `catch_up_rate` times a
+    second across all tasks. Tasks the rate can't bring back to the present are caught
+    up `once` instead.
+
+    Only tasks due within the next `window` seconds are kept in memory. The window is
+    refilled in the background through the `execute_on` index, at most `max_pending`
+    tasks are held at once, so memory does not grow with the size of the tables. When
+    the limit cuts the window short, it is refilled as soon as the loaded tasks run out.
+    """
+
+    def __init__(
+        self,
+        bot: "ModularBot",
+        window: float = 300,
+        max_pending: int = 50_000,
+        max_concurrency: int = 32,
+        catch_up_rate: float = 1.0,
+    ):
+        self.logger = logging.getLogger("tasks")
         self.bot = bot
+        self.window = window
+        self.max_pending = max_pending
+        self.catch_up_limiter = CatchUpLimiter(catch_up_rate)
+        self.scheduler = TaskScheduler(self.execute)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Every task due before the horizon is in the scheduler or being executed
+        self.horizon: float = 0.0
+        self._in_flight: set[TaskKey] = set()
+        self._loading_until: float = 0.0
+        self._executed_while_loading: Optional[set[TaskKey]] = None
+        self._refill_needed = asyncio.Event()
+        self._loader = bot.loop.create_task(self.load())
+
+    def cog_unload(self):
+        self._loader.cancel()
+        self.scheduler.stop()
+
+    async def load(self) -> None:
+        # Handlers of plugin task types are registered while plugins load
+        await self.bot.startup.wait()
+
+        self.scheduler.start()
+        while True:
+            self._refill_needed.clear()
+            try:
+                await self.refill()
+            except Exception as e:
+                self.logger.exception(f"Could not load pending tasks: {e}")
+
+            try:
+                await asyncio.wait_for(self._refill_needed.wait(), self.window / 2)
+            except asyncio.TimeoutError:
+                pass
+
+    def _check_horizon(self) -> None:
+        "Refills early when a full window stopped the horizon and the tasks before it ran out"
+
+        if len(self.scheduler) >= self.max_pending:
+            return
+        if self.horizon >= time.time() + self.window / 2:
+            return  # Not behind, the periodic refill is soon enough
+
+        deadline = self.scheduler.next_deadline()
+        if deadline is None or deadline >= self.horizon - self.window / 10:
+            self._refill_needed.set()
+
+    async def _fetch(
+        self, model: Type[Task], start: float, end: float, limit: int
+    ) -> list[Task]:
+        query = (
+            select(model)
+            .where(model.execute_on >= start, model.execute_on < end)
+            .order_by(model.execute_on)
+            .limit(limit)
+        )
+        if model is RepeatedTask:
+            query = query.where(RepeatedTask.active == True)
+
+        async with self.bot.session() as session:
+            return (await session.exec(query)).all()
+
+    async def refill(self) -> None:
+        "Loads tasks due before the end of the window that are not in memory yet"
+
+        limit = self.max_pending - len(self.scheduler)
+        if limit <= 0:
+            self.logger.warning("Task window is full, not loading more tasks")
+            return
+
+        # Tasks completed while the rows are read are tracked against the new end, the
+        # rows read for them may be stale
+        end = time.time() + self.window
+        self._loading_until = end
+        self._executed_while_loading = set()
+        try:
+            fetched = [
+                *await self._fetch(ScheduledTask, self.horizon, end, limit),
+                *await self._fetch(RepeatedTask, self.horizon, end, limit),
+            ]
+        finally:
+            executed, self._executed_while_loading = self._executed_while_loading, None
+            self._loading_until = 0.0
+        fetched.sort(key=lambda i: i.execute_on)
+
+        # Over the limit only a prefix is loaded, the horizon stops at its last deadline
+        if len(fetched) > limit:
+            fetched = fetched[:limit]
+        if len(fetched) == limit:
+            end = fetched[-1].execute_on
+
+        loaded = 0
+        for task in fetched:
+            key = task_key(task)
+            if (
+                key not in self.scheduler
+                and key not in self._in_flight
+                and key not in executed
+            ):
+                self.scheduler.push(task)
+                loaded += 1
+
+        self.horizon = max(self.horizon, end)
+        self.logger.debug(f"Loaded {loaded} tasks, {len(self.scheduler)} pending")
+
+    def _track(self, task: Task, deadline: Optional[float] = None) -> None:
+        "Keeps the task in memory if it is due within the window"
+
+        deadline = task.execute_on if deadline is None else deadline
+        if deadline < max(self.horizon, self._loading_until):
+            self.scheduler.push(task, deadline)
+
+    async def schedule(self, task: Task) -> Task:
+        "Stores a new task and schedules it, raises ValueError for unknown catch-up policies"
+
+        if isinstance(task, RepeatedTask) and task.catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Unknown catch-up policy {task.catch_up!r}")
+
+        async with self.bot.session() as session:
+            session.add(task)
+            await session.commit()
+            await session.refresh(task)
+
+        self._track(task)
+        return task
+
+    async def cancel(self, task: Task) -> bool:
+        "Deletes the task, returns False if it did not exist"
+
+        async with self.bot.session() as session:
+            result = await session.execute(
+                delete(type(task)).where(type(task).id == task.id)
+            )
+            await session.commit()
+
+        self.scheduler.cancel(task_key(task))
+        if isinstance(task, RepeatedTask):
+            self.catch_up_limiter.release(task.id)
+        return result.rowcount > 0
+
+    async def execute(self, tasks: list[Task]) -> None:
+        keys = [task_key(i) for i in tasks]
+        self._in_flight.update(keys)
+        if self._executed_while_loading is not None:
+            self._executed_while_loading.update(keys)
+
+        now = time.time()
+        steps: dict[int, int] = {}
+        groups: dict[tuple[str, int], list[Task]] = {}
+        handled: list[Task] = []
+        unhandled: set[str] = set()
+        for task in tasks:
+            # The plugin handling the type may not be loaded yet, the task waits for it
+            if not self._handled(task.type):
+                unhandled.add(task.type)
+                self.scheduler.push(task, now + UNHANDLED_DELAY)
+                continue
+
+            run = True
+            if isinstance(task, RepeatedTask):
+                try:
+                    run, steps[task.id] = catch_up(task, now, self.catch_up_limiter)
+                except ValueError as e:
+                    self.logger.error(f"Repeated task {task.id} is not run: {e}")
+                    continue
+                if steps[task.id] > 1:
+                    self.logger.info(
+                        f"Repeated task {task.id} missed {steps[task.id] - 1} runs, "
+                        f"{'running it once' if run else 'skipping them'}"
+                    )
+            handled.append(task)
+            if run:
+                groups.setdefault((task.type, task.guild_id), []).append(task)
+
+        if unhandled:
+            self.logger.warning(
+                f"No handler for task types {sorted(unhandled)}, "
+                f"trying again in {UNHANDLED_DELAY}s"
+            )
+
+        try:
+            await asyncio.gather(
+                *(self._run_group(group) for group in groups.values()),
+                return_exceptions=True,
+            )
+            if handled:
+                await self.complete(handled, steps)
+        finally:
+            self._in_flight.difference_update(keys)
+            self._check_horizon()
+
+    def _handled(self, type: str) -> bool:
+        return self.bot.task_handlers.get(type) is not None or bool(
+            self.bot.extra_events.get(f"on_{type}_task")
+        )
+
+    async def _run_group(self, tasks: list[Task]) -> None:
+        for task in tasks:
+            await self.run(task)
+
+    async def run(self, task: Task) -> None:
+        registry = self.bot.task_handlers
+        handler = registry.get(task.type)
+        if handler is None:
+            # Listeners are awaited instead of dispatched, so they count against the limit
+            event = f"on_{task.type}_task"
+            async with self._semaphore:
+                await asyncio.gather(
+                    *(
+                        self.bot._run_event(listener, event, task)
+                        for listener in self.bot.extra_events.get(event, [])
+                    )
+                )
+            return
+
+        # The slot of the type is taken first, waiting tasks don't hold a global slot
+        async with handler.semaphore, self._semaphore:
+            try:
+                await handler.run(task, registry.data(task, handler))
+            except asyncio.TimeoutError:
+                self.logger.error(
+                    f"Task {task_key(task)} of type {task.type} timed out"
+                )
+            except Exception as e:
+                self.logger.exception(
+                    f"Task {task_key(task)} of type {task.type} failed: {e}"
+                )
+
+    async def complete(
+        self, tasks: list[Task], steps: Optional[dict[int, int]] = None
+    ) -> None:
+        """Deletes finished scheduled tasks and moves repeated tasks to their next run
+
+        Repeated tasks are moved by `steps[task.id]` repetitions, one by default. The
+        tasks are changed in memory only once the database is, a failed write is retried
+        every `RETRY_DELAY` seconds without running the tasks again.
+        """
+
+        scheduled = [i.id for i in tasks if isinstance(i, ScheduledTask)]
+        repeated = [i for i in tasks if isinstance(i, RepeatedTask)]
+        moved = {
+            i.id: i.execute_on + (steps or {}).get(i.id, 1) * i.repeat_time
+            for i in repeated
+        }
+
+        while True:
+            try:
+                await self._write_completion(scheduled, moved)
+                break
+            except Exception as e:
+                self.logger.exception(
+                    f"Could not complete {len(tasks)} tasks, retrying in "
+                    f"{RETRY_DELAY}s: {e}"
+                )
+                await asyncio.sleep(RETRY_DELAY)
+
+        for task in tasks:
+            if isinstance(task, ScheduledTask):
+                self.bot.task_handlers.forget(task)
+        for task in repeated:
+            task.execute_on = moved[task.id]
+
+        # Tasks catching up on all missed runs share one rate instead of running in a
+        # burst, they are overdue so the refill would not find them again
+        now = time.time()
+        for task in repeated:
+            if task.execute_on <= now:
+                self.scheduler.push(task, self.catch_up_limiter.slot(now))
+            else:
+                self._track(task)
 
-    # TODO - Port all reconnect logic and tasks
+    async def _write_completion(
+        self, scheduled: list[int], moved: dict[int, float]
+    ) -> None:
+        repeated = list(moved)
+        async with self.bot.session() as session:
+            for start in range(0, len(scheduled), WRITE_CHUNK):
+                chunk = scheduled[start : start + WRITE_CHUNK]
+                await session.execute(
+                    delete(ScheduledTask).where(ScheduledTask.id.in_(chunk))
+                )
+            for start in range(0, len(repeated), WRITE_CHUNK):
+                values = {i: moved[i] for i in repeated[start : start + WRITE_CHUNK]}
+                await session.execute(
+                    update(RepeatedTask)
+                    .where(RepeatedTask.id.in_(values))
+                    .values(execute_on=case(values, value=RepeatedTask.id))
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
 
 
-def setup(bot):
+def setup(bot: "ModularBot"):
     bot.add_cog(Tasks(bot))
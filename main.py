@@ -2,6 +2,7 @@ import argparse
 import logging
 import os
 import subprocess
+from typing import AsyncContextManager, Optional
 
 import discord
 from coloredlogs import install as install_coloredlogs
@@ -14,17 +15,23 @@ from discord.ext.commands.errors import (
     ExtensionNotLoaded,
 )
 from pretty_help import PrettyHelp
-from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.sql.expression import Select, SelectOfScalar
 
 from api_commands import *
 from api_commands.commands import commands as imported_commands
+from core.cache import ConfigCache, PrefixCache
 from core.functions import is_in_virtualenv
+from core.guilds import load_prefixes, reconcile_guilds
 from core.plugin import Plugin
 from core.plugin_handler import PluginHandler
-from db import generate_engine, get_session
+from core.reactions import ReactionDispatcher
+from core.reloader import HotReloader
+from core.startup import StartupPipeline
+from core.task_handlers import TaskHandlerRegistry
+from core.watchdog import LoopWatchdog
+from db import generate_engine, get_session_factory, session_scope
 from models.config import Config
-from models.guild import Guild
 
 # Fix sqlalchemy caching with sqlmodel
 SelectOfScalar.inherit_cache = True  # type: ignore
@@ -58,16 +65,24 @@ def get_prefix(bot: "ModularBot", msg: discord.Message) -> list[str]:
         if msg.guild == None:
             return commands.when_mentioned_or("!")(bot, msg)  # type: ignore
 
-        statement = select(Guild).where(Guild.id == msg.guild.id)
-        server = bot.database.exec(statement).first()
-        prefix = server.prefix if server else "!"
+        prefix = bot.prefix_cache.get(msg.guild.id)
 
         logging.debug(f"Using prefix {prefix} for this server")
         return commands.when_mentioned_or(prefix)(bot, msg)  # type: ignore
 
 
 class ModularBot(AutoShardedBot):
-    def __init__(self, enable_rce: bool = False, disable_plugins: bool = False) -> None:
+    def __init__(
+        self,
+        enable_rce: bool = False,
+        disable_plugins: bool = False,
+        prune_guilds: bool = False,
+        lazy_idle_timeout: Optional[float] = None,
+        trace_memory: bool = False,
+        watchdog_threshold: float = 1.0,
+        watchdog_strikes: Optional[int] = None,
+        hot_reload: bool = False,
+    ) -> None:
         super().__init__(
             command_prefix=get_prefix,  # type: ignore
             help_command=PrettyHelp(
@@ -80,50 +95,115 @@ class ModularBot(AutoShardedBot):
         self.paused: bool = False
         self.__version__: str = "0.0.1alpha"
 
-        # Database stuff
+        # Database stuff, every coroutine opens its own session with `self.session()`
         self.engine = generate_engine()
-        self.database: Session = get_session(self.engine)
+        self.session_factory = get_session_factory(self.engine)
+        self.config_cache: ConfigCache = ConfigCache(self)
 
-        # Set up config for the bot
-        self.setup_config()
+        # Guild prefixes, loaded right after the config and refreshed by guild reconciliation
+        self.prefix_cache: PrefixCache = PrefixCache()
+
+        # Delete guilds the bot has left when reconciling
+        self.prune_guilds: bool = prune_guilds
+
+        # Reaction controls of paginators and confirmations
+        self.reactions: ReactionDispatcher = ReactionDispatcher(self)
+        self.add_listener(self.reactions.on_reaction_add, "on_reaction_add")
+
+        # Handlers of scheduled task types, registered by extensions and plugins
+        self.task_handlers: TaskHandlerRegistry = TaskHandlerRegistry()
 
         # Plugins
         self.disable_plugins: bool = disable_plugins
         self.plugins: list[Plugin] = []
-        self.plugin_handler: PluginHandler = PluginHandler(self)
+        self.plugin_handler: PluginHandler = PluginHandler(
+            self, lazy_idle_timeout=lazy_idle_timeout, trace_memory=trace_memory
+        )
+        self.add_listener(self.plugin_handler.lazy.on_command, "on_command")
         if self.disable_plugins:
             logging.warning("Plugins are disabled")
 
+        # Finds plugins blocking the event loop, disables them after `watchdog_strikes` times
+        self.watchdog: LoopWatchdog = LoopWatchdog(
+            self, threshold=watchdog_threshold, strikes=watchdog_strikes
+        )
+
+        # Reloads changed extensions and plugin files while running
+        self.hot_reload: bool = hot_reload
+        self.reloader: HotReloader = HotReloader(self)
+
         # Web
         self.web = subprocess.Popen("uvicorn web:app", shell=True)
 
         # Custom commands from web
         self.custom_commands = imported_commands
 
-        if not disable_plugins:
-            self.plugin_handler.populate_plugins()
-            logging.info(f"Plugins: {[i.name for i in self.plugins]}")
-            self.plugin_handler.install_requirements()
-            self.plugin_handler.load_all_plugins()
-
         # RCE
         self.enable_rce: bool = enable_rce
 
+        # Everything else runs in the background once the gateway connection starts
+        self.startup: StartupPipeline = StartupPipeline(self)
+        self.startup.add_stage("config", self.setup_config)
+        self.startup.add_stage("prefixes", self.setup_prefixes)
+        if not disable_plugins:
+            self.startup.add_stage("plugin sync", self.plugin_handler.populate_plugins)
+            self.startup.add_stage(
+                "requirements", self.plugin_handler.install_requirements
+            )
+            self.startup.add_stage(
+                "plugin loading", self.plugin_handler.load_all_plugins
+            )
+        self.startup.add_stage("guild reconciliation", self.setup_guilds)
+
     def run(self, token: str, *, bot: bool = True, reconnect: bool = True) -> None:
         super().run(token, bot=bot, reconnect=reconnect)
 
+    async def start(self, *args, **kwargs) -> None:
+        self.plugin_handler.profiler.install()
+        self.watchdog.start()
+        if self.hot_reload:
+            self.reloader.start()
+        self.startup.start()
+        await super().start(*args, **kwargs)
+
+    async def invoke(self, ctx: Context) -> None:
+        profiler = self.plugin_handler.profiler
+        plugin = profiler.plugin_for_module(getattr(ctx.command, "module", None))
+        if plugin is None:
+            await super().invoke(ctx)
+        else:
+            await profiler.measure(super().invoke(ctx), plugin, "command")
+
+    async def _run_event(self, coro, event_name: str, *args, **kwargs) -> None:
+        # Listeners of plugins are timed by the profiler
+        profiler = self.plugin_handler.profiler
+        plugin = profiler.plugin_for_module(getattr(coro, "__module__", None))
+        if plugin is not None:
+            coro = profiler.wrap(coro, plugin, "listener")
+        await super()._run_event(coro, event_name, *args, **kwargs)
+
     def restart_web(self) -> None:
         self.web.kill()
         self.web = subprocess.Popen("python web.py", shell=True, cwd=os.getcwd())
 
-    def setup_config(self) -> None:
-        config = self.database.exec(select(Config)).first()
+    def session(self) -> AsyncContextManager[AsyncSession]:
+        "Opens a new database session, use as `async with bot.session() as session`"
+
+        return session_scope(self.session_factory)
+
+    @property
+    def config(self) -> Config:
+        return self.config_cache.get()
+
+    async def setup_config(self) -> None:
+        await self.config_cache.refresh()
 
-        if not config:
-            logging.warning("No config found, creating one")
-            self.database.add(Config())
-            self.database.commit()
-            logging.info("Config created")
+    async def setup_prefixes(self) -> None:
+        await load_prefixes(self)
+
+    async def setup_guilds(self) -> None:
+        await self.wait_until_ready()
+        await reconcile_guilds(self, prune=self.prune_guilds)
 
 
 if __name__ == "__main__":
@@ -153,6 +233,37 @@ if __name__ == "__main__":
     parser.add_argument(
         "--disable-plugins", action="store_true", help="Disable plugins"
     )
+    parser.add_argument(
+        "--prune-guilds",
+        action="store_true",
+        help="Remove guilds the bot is no longer in from the database on ready",
+    )
+    parser.add_argument(
+        "--lazy-idle-timeout",
+        type=float,
+        help="Unload lazy plugins after this many seconds without a command",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Trace memory allocated by plugins, slows the bot down",
+    )
+    parser.add_argument(
+        "--watchdog-threshold",
+        default=1.0,
+        type=float,
+        help="Event loop lag in seconds reported as blocking",
+    )
+    parser.add_argument(
+        "--watchdog-strikes",
+        type=int,
+        help="Disable plugins that block the event loop this many times in 10 minutes",
+    )
+    parser.add_argument(
+        "--hot-reload",
+        action="store_true",
+        help="Reload extensions and plugin files when they change on disk",
+    )
     args = parser.parse_args()
 
     if args.file:
@@ -178,7 +289,16 @@ if __name__ == "__main__":
         exit(1)
 
     # Init bot and add necessary commands
-    bot = ModularBot(enable_rce=args.enable_rce, disable_plugins=args.disable_plugins)
+    bot = ModularBot(
+        enable_rce=args.enable_rce,
+        disable_plugins=args.disable_plugins,
+        prune_guilds=args.prune_guilds,
+        lazy_idle_timeout=args.lazy_idle_timeout,
+        trace_memory=args.trace_memory,
+        watchdog_threshold=args.watchdog_threshold,
+        watchdog_strikes=args.watchdog_strikes,
+        hot_reload=args.hot_reload,
+    )
 
     @bot.command(name="reload")
     @commands.is_owner()
@@ -241,7 +361,9 @@ if __name__ == "__main__":
     @commands.is_owner()
     async def command_reload_all_extensions(ctx: Context) -> None:
         all_extensions = [
-            i.replace(".py", "") for i in os.listdir("extensions") if i.endswith(".py")
+            "extensions." + i.replace(".py", "")
+            for i in os.listdir("extensions")
+            if i.endswith(".py")
         ]
 
         ok = True
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from sqlmodel import BigInteger, Column, Field, SQLModel
 
 
@@ -11,6 +13,8 @@ class PluginData(SQLModel, table=True):
     version: str
     folder_name: str
     enabled: bool = Field(default=False)
+    lazy: bool = Field(default=False)  # Load on first command use
+    isolated: bool = Field(default=False)  # Run commands in a worker process
 
 
 class PluginFiles(SQLModel, table=True):
@@ -20,3 +24,10 @@ class PluginFiles(SQLModel, table=True):
     plugin_id: int = Field(sa_column=Column(BigInteger(), autoincrement=False))
     file: str
     file_url: str
+    content_hash: Optional[str] = Field(default=None)  # SHA-256 hex digest
+
+
+class PluginDependencies(SQLModel, table=True):
+    id: int = Field(sa_column=Column(BigInteger(), primary_key=True), default=None)
+    plugin_id: int = Field(sa_column=Column(BigInteger(), nullable=False))
+    dependency_id: int = Field(sa_column=Column(BigInteger(), nullable=False))
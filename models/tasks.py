@@ -7,7 +7,7 @@ class ScheduledTask(SQLModel, table=True):
     owner: int = Field(sa_column=Column(BigInteger(), nullable=False))
     type: str
     data: str
-    execute_on: float
+    execute_on: float = Field(index=True)
 
 
 class RepeatedTask(SQLModel, table=True):
@@ -16,6 +16,9 @@ class RepeatedTask(SQLModel, table=True):
     owner: int = Field(sa_column=Column(BigInteger(), nullable=False))
     type: str
     data: str
-    execute_on: float
+    execute_on: float = Field(index=True)
     repeat_time: float
     active: bool = Field(default=True, nullable=False)
+    catch_up: str = Field(
+        default="once"
+    )  # once, skip or all, see core.scheduler.catch_up
@@ -1,13 +1,13 @@
-from db import generate_engine, get_session
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from models.config import Config
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from routes.dependencies import get_db
 
 router = APIRouter(tags=["config"])
-engine = generate_engine()
-db = get_session(engine)
 
 
 @router.get("/config")
-async def config():
-    return db.exec(select(Config)).all().__str__()
+async def config(db: AsyncSession = Depends(get_db)):
+    return (await db.exec(select(Config))).all().__str__()
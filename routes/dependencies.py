@@ -0,0 +1,14 @@
+from typing import AsyncIterator
+
+from db import generate_engine, get_session_factory, session_scope
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+engine = generate_engine()
+session_factory = get_session_factory(engine)
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    "FastAPI dependency, opens one session per request"
+
+    async with session_scope(session_factory) as session:
+        yield session
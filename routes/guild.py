@@ -1,18 +1,18 @@
-from db import generate_engine, get_session
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from models.guild import Guild
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from routes.dependencies import get_db
 
 router = APIRouter(tags=["guild"])
-engine = generate_engine()
-db = get_session(engine)
 
 
 @router.get("/guild/{guild_id}")
-async def guild(guild_id: int):
-    return db.exec(select(Guild).where(Guild.id == guild_id)).all().__str__()
+async def guild(guild_id: int, db: AsyncSession = Depends(get_db)):
+    return (await db.exec(select(Guild).where(Guild.id == guild_id))).all().__str__()
 
 
 @router.get("/guilds")
-async def guilds():
-    return db.exec(select(Guild)).all().__str__()
+async def guilds(db: AsyncSession = Depends(get_db)):
+    return (await db.exec(select(Guild))).all().__str__()
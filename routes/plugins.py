@@ -0,0 +1,17 @@
+import json
+
+from fastapi import APIRouter, HTTPException
+
+router = APIRouter(tags=["plugins"])
+
+# Written periodically by the bot process, see core.profiler.PluginProfiler
+PROFILE_PATH = "plugins/.profile.json"
+
+
+@router.get("/plugins/profile")
+async def plugin_profile():
+    try:
+        with open(PROFILE_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise HTTPException(status_code=404, detail="No plugin profile written yet")
@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from aiohttp import web
+
+from core.downloader import DownloadError, Downloader, HashMismatch
+
+CONTENT = b"print('hello')\n" * 1000
+CONTENT_HASH = hashlib.sha256(CONTENT).hexdigest()
+
+
+async def serve(routes: dict, test) -> None:
+    "Runs the test against a local server, `routes` maps paths to handlers"
+
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_get(path, handler)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+
+    try:
+        await test(f"http://127.0.0.1:{port}")
+    finally:
+        await runner.cleanup()
+
+
+def flaky(failures: int, status: int = 500):
+    "Handler failing with `status` the first `failures` times"
+
+    calls = []
+
+    async def handler(request: web.Request) -> web.Response:
+        calls.append(request.path)
+        if len(calls) <= failures:
+            return web.Response(status=status)
+        return web.Response(body=CONTENT)
+
+    return handler, calls
+
+
+async def content(request: web.Request) -> web.Response:
+    return web.Response(body=CONTENT)
+
+
+def test_retries_server_errors(tmp_path):
+    handler, calls = flaky(2)
+    path = str(tmp_path / "main.py")
+
+    async def test(url: str) -> None:
+        async with Downloader(retries=3, backoff=0.01) as downloader:
+            assert await downloader.download(url + "/file", path) == CONTENT_HASH
+
+    asyncio.run(serve({"/file": handler}, test))
+    assert len(calls) == 3
+    with open(path, "rb") as f:
+        assert f.read() == CONTENT
+
+
+def test_gives_up_after_retries(tmp_path):
+    handler, calls = flaky(10)
+    path = str(tmp_path / "main.py")
+
+    async def test(url: str) -> None:
+        async with Downloader(retries=2, backoff=0.01) as downloader:
+            with pytest.raises(DownloadError):
+                await downloader.download(url + "/file", path)
+
+    asyncio.run(serve({"/file": handler}, test))
+    assert len(calls) == 3
+    assert not os.path.exists(path)
+
+
+def test_client_errors_are_not_retried(tmp_path):
+    handler, calls = flaky(10, status=404)
+
+    async def test(url: str) -> None:
+        async with Downloader(retries=3, backoff=0.01) as downloader:
+            with pytest.raises(DownloadError):
+                await downloader.download(url + "/file", str(tmp_path / "main.py"))
+
+    asyncio.run(serve({"/file": handler}, test))
+    assert len(calls) == 1
+
+
+def test_rate_limit_is_retried(tmp_path):
+    handler, calls = flaky(1, status=429)
+
+    async def test(url: str) -> None:
+        async with Downloader(retries=3, backoff=0.01) as downloader:
+            await downloader.download(url + "/file", str(tmp_path / "main.py"))
+
+    asyncio.run(serve({"/file": handler}, test))
+    assert len(calls) == 2
+
+
+def test_hash_mismatch(tmp_path):
+    path = str(tmp_path / "main.py")
+
+    async def test(url: str) -> None:
+        async with Downloader(retries=1, backoff=0.01) as downloader:
+            with pytest.raises(DownloadError) as error:
+                await downloader.download(url + "/file", path, "0" * 64)
+            assert isinstance(error.value.__cause__, HashMismatch)
+
+    asyncio.run(serve({"/file": content}, test))
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + ".part")
+
+
+def test_expected_hash_is_case_insensitive(tmp_path):
+    async def test(url: str) -> None:
+        async with Downloader() as downloader:
+            digest = await downloader.download(
+                url + "/file", str(tmp_path / "main.py"), CONTENT_HASH.upper()
+            )
+            assert digest == CONTENT_HASH
+
+    asyncio.run(serve({"/file": content}, test))
+
+
+def test_nested_paths(tmp_path):
+    files = [
+        (f"/{name}", str(tmp_path / "plugin" / name))
+        for name in ["main.py", "cogs/admin.py", "cogs/data/words.txt"]
+    ]
+
+    async def test(url: str) -> None:
+        async with Downloader() as downloader:
+            results = await downloader.download_all(
+                (url + route, path, CONTENT_HASH) for route, path in files
+            )
+            assert results == [CONTENT_HASH] * len(files)
+
+    asyncio.run(serve({route: content for route, _ in files}, test))
+    for _, path in files:
+        with open(path, "rb") as f:
+            assert f.read() == CONTENT
@@ -0,0 +1,24 @@
+from core.requirements import parse_requirements
+
+
+def test_plain_requirements_are_parsed():
+    requirements, unparsed = parse_requirements(
+        ["requests>=2.0  # http", "# comment", "", "numpy; python_version >= '3.8'"]
+    )
+
+    assert [i.name for i in requirements] == ["requests", "numpy"]
+    assert unparsed == []
+
+
+def test_lines_only_pip_understands_are_kept():
+    lines = [
+        "-r other.txt",
+        "-e git+https://example.com/repo.git#egg=repo",
+        "git+https://example.com/repo.git",
+        "--index-url https://example.com/simple",
+    ]
+
+    requirements, unparsed = parse_requirements(lines)
+
+    assert requirements == []
+    assert unparsed == lines
@@ -0,0 +1,119 @@
+import heapq
+
+import pytest
+
+from core.scheduler import CatchUpLimiter, catch_up
+from models.tasks import RepeatedTask
+
+
+def repeated(
+    id: int = 1, execute_on: float = 0, repeat_time: float = 10, policy: str = "once"
+) -> RepeatedTask:
+    return RepeatedTask(
+        id=id,
+        guild_id=1,
+        owner=1,
+        type="test",
+        data="{}",
+        execute_on=execute_on,
+        repeat_time=repeat_time,
+        catch_up=policy,
+    )
+
+
+@pytest.mark.parametrize("policy", ["once", "skip", "all"])
+def test_on_time_runs_once(policy):
+    assert catch_up(repeated(policy=policy), now=5) == (True, 1)
+
+
+def test_once_moves_past_missed_runs():
+    # Due at 0, 10, 20 and 30, the next run is at 40
+    assert catch_up(repeated(policy="once"), now=35) == (True, 4)
+
+
+def test_skip_does_not_run():
+    assert catch_up(repeated(policy="skip"), now=35) == (False, 4)
+
+
+def test_all_without_limiter_runs_every_repetition():
+    assert catch_up(repeated(policy="all"), now=35) == (True, 1)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        catch_up(repeated(policy="sometimes"), now=5)
+
+
+def test_limiter_admits_while_demand_is_below_rate():
+    limiter = CatchUpLimiter(rate=1.0)
+
+    assert catch_up(repeated(1, repeat_time=4, policy="all"), 35, limiter) == (True, 1)
+    assert catch_up(repeated(2, repeat_time=4, policy="all"), 35, limiter) == (True, 1)
+    assert limiter.demand == pytest.approx(0.5)
+    # Would need 1.25 runs a second in total
+    assert catch_up(repeated(3, repeat_time=1.25, policy="all"), 35, limiter) == (
+        True,
+        29,
+    )
+    assert 3 not in limiter
+
+
+def test_limiter_rejects_task_repeating_at_the_rate():
+    limiter = CatchUpLimiter(rate=1.0)
+
+    assert not limiter.admit(repeated(repeat_time=1, policy="all"), now=35)
+    assert len(limiter) == 0
+
+
+def test_limiter_releases_task_whose_lag_stopped_shrinking():
+    limiter = CatchUpLimiter(rate=1.0)
+    task = repeated(repeat_time=10, policy="all")
+
+    assert limiter.admit(task, now=35)
+    task.execute_on += task.repeat_time
+    assert limiter.admit(task, now=36)
+    task.execute_on += task.repeat_time
+    assert not limiter.admit(task, now=60)
+    assert task.id not in limiter
+    assert limiter.demand == 0
+
+
+def test_caught_up_task_is_released():
+    limiter = CatchUpLimiter(rate=1.0)
+    task = repeated(repeat_time=10, policy="all")
+
+    catch_up(task, 35, limiter)
+    task.execute_on = 40
+    assert catch_up(task, 41, limiter) == (True, 1)
+    assert len(limiter) == 0
+
+
+def test_slots_are_shared():
+    limiter = CatchUpLimiter(rate=4.0)
+
+    assert [limiter.slot(10) for _ in range(3)] == [10.25, 10.5, 10.75]
+    assert limiter.slot(20) == 20.25
+
+
+def test_backlog_drains():
+    "Five tasks 100s behind with one catch-up run a second all get back to the present"
+
+    limiter = CatchUpLimiter(rate=1.0)
+    tasks = [repeated(i, 0, repeat_time=2, policy="all") for i in range(5)]
+    now = 100.0
+    queue = [(now, task.id) for task in tasks]
+    runs = 0
+
+    while queue and now < 1000:
+        now, id = heapq.heappop(queue)
+        task = tasks[id]
+        run, steps = catch_up(task, now, limiter)
+        runs += run
+        task.execute_on += steps * task.repeat_time
+        if task.execute_on <= now:
+            heapq.heappush(queue, (limiter.slot(now), id))
+
+    # Every task is back on its normal schedule
+    assert not queue
+    assert now < 300
+    assert runs < 200
@@ -3,12 +3,9 @@ from fastapi.staticfiles import StaticFiles
 from sqlmodel.sql.expression import Select, SelectOfScalar
 from starlette.responses import FileResponse
 
-from db import generate_engine, get_session
-from routes import config, guild
+from routes import config, guild, plugins
 
 app = FastAPI()
-engine = generate_engine()
-db = get_session(engine)
 
 # sqlmodel stuff
 SelectOfScalar.inherit_cache = True  # type: ignore
@@ -16,6 +13,7 @@ Select.inherit_cache = True  # type: ignore
 
 app.include_router(config.router)
 app.include_router(guild.router)
+app.include_router(plugins.router)
 app.mount("/assets", StaticFiles(directory="assets"), name="assets")
 
 